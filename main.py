@@ -4,11 +4,21 @@ import uvicorn
 import yaml
 from fastapi import FastAPI
 
-from src.routes import register_routes
+from src.responses import FastJSONResponse
+from src.routes import (
+    register_exception_handlers,
+    register_middleware,
+    register_routes,
+)
 from src.services import base_init
+from src.services.admission import configure_write_admission
+from src.services.order_service import configure_write_batching
+from src.services.slow_queries import configure_slow_query_log
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 register_routes(app)
+register_exception_handlers(app)
+register_middleware(app)
 
 
 if __name__ == "__main__":
@@ -21,5 +31,11 @@ if __name__ == "__main__":
     logging.config.dictConfig(cfg["logger"])
     logger = logging.getLogger("app")
 
-    base_init(cfg["db_path"])
+    base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+    write_batching = cfg.get("write_batching", {})
+    configure_write_batching(
+        write_batching.get("enabled", False), write_batching.get("max_batch_size", 100)
+    )
+    configure_write_admission(**cfg.get("write_admission", {}))
+    configure_slow_query_log(**cfg.get("slow_query_log", {"enabled": False}))
     uvicorn.run("main:app", port=8000, reload=False, log_level="info")
@@ -0,0 +1,22 @@
+import asyncio
+import logging.config
+
+import yaml
+
+from src.services import base_init
+from src.services.rollup_service import rebuild_rollups
+
+
+if __name__ == "__main__":
+    with open("src/config/config.yaml", encoding="utf-8") as stream:
+        try:
+            cfg = yaml.safe_load(stream)
+        except yaml.YAMLError as exc:
+            print("Can't read config file")
+            raise exc
+    logging.config.dictConfig(cfg["logger"])
+    logger = logging.getLogger("app")
+
+    base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+    asyncio.run(rebuild_rollups())
+    logger.info("Order rollups rebuilt")
@@ -1 +1,6 @@
-from src.exceptions.exceptions import NotFoundError, NotEnoughProduct
+from src.exceptions.exceptions import (
+    NotFoundError,
+    NotEnoughProduct,
+    InvalidCursorError,
+    ServiceBusyError,
+)
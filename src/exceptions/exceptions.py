@@ -4,3 +4,13 @@ class NotFoundError(Exception):
 
 class NotEnoughProduct(Exception):
     pass
+
+
+class InvalidCursorError(Exception):
+    pass
+
+
+class ServiceBusyError(Exception):
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, status
+
+from src.responses import FastJSONResponse
+from src.services.slow_queries import get_slow_queries
+
+router = APIRouter()
+
+
+@router.get(
+    "/slow-queries",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "time": "2024-09-20T12:00:00.000000",
+                            "engine": "reader",
+                            "route": "GET /orders/",
+                            "duration_ms": 152.4,
+                            "statement": "SELECT orders.order_id, ... FROM orders",
+                            "parameters": "()",
+                            "plan": ["SCAN orders"],
+                        }
+                    ]
+                }
+            },
+            "description": "Recent slow queries, newest first",
+        },
+    },
+)
+async def get_slow_queries_list():
+    return FastJSONResponse(content=get_slow_queries(), status_code=status.HTTP_200_OK)
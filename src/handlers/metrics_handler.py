@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from src.services.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    response_class=Response,
+    responses={
+        200: {
+            "content": {"text/plain": {}},
+            "description": "Metrics in the Prometheus text exposition format",
+        },
+    },
+)
+async def get_metrics():
+    return Response(
+        render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,11 +1,14 @@
+from datetime import datetime
 from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, status, Path
-from starlette.responses import JSONResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Path, Query
+from starlette.responses import StreamingResponse
 
-from src.exceptions import NotFoundError, NotEnoughProduct
-from src.schemas import PostOrder
+from src.exceptions import NotFoundError, NotEnoughProduct, InvalidCursorError
+from src.responses import SERVICE_BUSY_RESPONSE, FastJSONResponse, dumps
+from src.schemas import PostOrder, OrderFilter
 import src.services.order_service as service
+import src.services.rollup_service as rollup_service
 
 router = APIRouter()
 
@@ -16,24 +19,70 @@ router = APIRouter()
     responses={
         201: {
             "content": {"application/json": {"example": {"id": 12}}},
-            "description": "Order created",
+            "description": "Order created, or the order already created "
+            "with the same Idempotency-Key",
         },
         400: {"description": "Not enough product to create order"},
         404: {"description": "Product not found"},
+        **SERVICE_BUSY_RESPONSE,
     },
 )
-async def post_order(args: PostOrder):
+async def post_order(
+    args: PostOrder, idempotency_key: Annotated[str | None, Header()] = None
+):
     try:
-        order = await service.post_order(args)
+        order = await service.post_order(args, idempotency_key)
     except NotFoundError as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
     except NotEnoughProduct as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_400_BAD_REQUEST)
-    return JSONResponse(
+    return FastJSONResponse(
         content={"id": order.order_id}, status_code=status.HTTP_201_CREATED
     )
 
 
+@router.post(
+    "/bulk",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": [
+                        {"status_code": 201, "id": 12},
+                        {
+                            "status_code": 404,
+                            "detail": ["Can't find product with id 3"],
+                        },
+                        {
+                            "status_code": 400,
+                            "detail": ["Not enough product with id 1 (2/5)"],
+                        },
+                    ]
+                }
+            },
+            "description": "Result of every order, in input order",
+        },
+        **SERVICE_BUSY_RESPONSE,
+    },
+)
+async def post_orders(args: list[PostOrder]):
+    results = []
+    for result in await service.post_orders(args):
+        if isinstance(result, NotFoundError):
+            results.append(
+                {"status_code": status.HTTP_404_NOT_FOUND, "detail": result.args}
+            )
+        elif isinstance(result, NotEnoughProduct):
+            results.append(
+                {"status_code": status.HTTP_400_BAD_REQUEST, "detail": result.args}
+            )
+        else:
+            results.append(
+                {"status_code": status.HTTP_201_CREATED, "id": result.order_id}
+            )
+    return FastJSONResponse(content=results, status_code=status.HTTP_200_OK)
+
+
 @router.get("", include_in_schema=False)
 @router.get(
     "/",
@@ -51,6 +100,110 @@ async def post_order(args: PostOrder):
                             },
                             "created_at": "2024-09-20T12:00:00.000000",
                             "updated_at": "2024-09-20T12:00:00.000000",
+                            "total": 185.1,
+                        }
+                    ]
+                }
+            },
+            "description": "Ok",
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor for the next page, pass it as `after`",
+                    "schema": {"type": "string"},
+                }
+            },
+        },
+        400: {"description": "Invalid pagination cursor"},
+    },
+)
+async def get_orders(
+    filters: Annotated[OrderFilter, Depends()],
+    limit: int | None = None,
+    offset: int = 0,
+    after: str | None = None,
+):
+    try:
+        orders, next_cursor = await service.get_orders(limit, offset, after, filters)
+    except InvalidCursorError as e:
+        raise HTTPException(detail=e.args, status_code=status.HTTP_400_BAD_REQUEST)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return FastJSONResponse(
+        content=orders, status_code=status.HTTP_200_OK, headers=headers
+    )
+
+
+@router.get(
+    "/stats",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": {
+                        "by_status": [{"status": "Created", "orders": 3, "units": 7}],
+                        "by_day": [{"day": "2024-09-20", "orders": 3, "units": 7}],
+                        "by_product": [
+                            {
+                                "product_id": 12,
+                                "name": "Product1",
+                                "orders": 2,
+                                "units": 5,
+                            }
+                        ],
+                    }
+                }
+            },
+            "description": "Ok",
+        },
+    },
+)
+async def get_order_stats(filters: Annotated[OrderFilter, Depends()]):
+    stats = await service.get_order_stats(filters)
+    return FastJSONResponse(content=stats, status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/stats/hourly",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "bucket": "2024-09-20T12:00:00",
+                            "status": "Created",
+                            "orders": 3,
+                            "units": 7,
+                            "revenue": 86.1,
+                        }
+                    ]
+                }
+            },
+            "description": "Ok",
+        },
+    },
+)
+async def get_hourly_stats(
+    order_status: Annotated[str | None, Query(alias="status")] = None,
+    bucket_from: datetime | None = None,
+    bucket_to: datetime | None = None,
+):
+    stats = await rollup_service.get_hourly_stats(bucket_from, bucket_to, order_status)
+    return FastJSONResponse(content=stats, status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/stats/products",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "product_id": 12,
+                            "status": "Created",
+                            "orders": 2,
+                            "units": 5,
+                            "revenue": 61.5,
                         }
                     ]
                 }
@@ -59,9 +212,29 @@ async def post_order(args: PostOrder):
         },
     },
 )
-async def get_orders(limit: int | None = None, offset: int = 0):
-    orders = await service.get_orders(limit, offset)
-    return JSONResponse(content=orders, status_code=status.HTTP_200_OK)
+async def get_product_sales_stats(
+    order_status: Annotated[str | None, Query(alias="status")] = None,
+):
+    stats = await rollup_service.get_product_sales_stats(order_status)
+    return FastJSONResponse(content=stats, status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "All orders, one JSON object per line",
+        },
+    },
+)
+async def export_orders():
+    async def lines():
+        async for order in service.export_orders():
+            yield dumps(order) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.get(
@@ -79,6 +252,7 @@ async def get_orders(limit: int | None = None, offset: int = 0):
                         },
                         "created_at": "2024-09-20T12:00:00.000000",
                         "updated_at": "2024-09-20T12:00:00.000000",
+                        "total": 185.1,
                     }
                 }
             },
@@ -92,7 +266,7 @@ async def get_order(id: int):
         order = await service.get_order(id)
     except NotFoundError as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
-    return JSONResponse(content=order, status_code=status.HTTP_200_OK)
+    return FastJSONResponse(content=order, status_code=status.HTTP_200_OK)
 
 
 @router.patch(
@@ -106,12 +280,14 @@ async def get_order(id: int):
                         "status": "Created",
                         "created_at": "2024-09-20T12:00:00.000000",
                         "updated_at": "2024-09-20T12:00:00.000000",
+                        "total": 185.1,
                     }
                 }
             },
             "description": "Ok",
         },
         404: {"description": "Order not found"},
+        **SERVICE_BUSY_RESPONSE,
     },
 )
 async def set_order_status(order_status: str, id: Annotated[int, Path()]):
@@ -119,4 +295,6 @@ async def set_order_status(order_status: str, id: Annotated[int, Path()]):
         order = await service.set_order_status(id, order_status)
     except NotFoundError as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
-    return JSONResponse(content=order.as_dict(), status_code=status.HTTP_200_OK)
+    return FastJSONResponse(
+        content=order.as_dict(), status_code=status.HTTP_200_OK
+    )
@@ -1,10 +1,11 @@
 from typing import Annotated
 
-from fastapi import APIRouter, status, HTTPException, Path
-from starlette.responses import JSONResponse, Response
+from fastapi import APIRouter, status, HTTPException, Path, Query
+from starlette.responses import StreamingResponse, Response
 
-from src.exceptions import NotFoundError
-from src.schemas import PostProduct, PutProduct
+from src.exceptions import NotFoundError, InvalidCursorError
+from src.responses import SERVICE_BUSY_RESPONSE, FastJSONResponse, dumps
+from src.schemas import PostProduct, PutProduct, BulkPutProduct
 import src.services.product_service as service
 
 router = APIRouter()
@@ -18,15 +19,54 @@ router = APIRouter()
             "content": {"application/json": {"example": {"id": 12}}},
             "description": "Product created",
         },
+        **SERVICE_BUSY_RESPONSE,
     },
 )
 async def post_product(args: PostProduct):
     product = await service.post_product(args)
-    return JSONResponse(
+    return FastJSONResponse(
         content={"id": product.product_id}, status_code=status.HTTP_201_CREATED
     )
 
 
+@router.post(
+    "/bulk",
+    responses={
+        201: {
+            "content": {"application/json": {"example": {"ids": [12, 13]}}},
+            "description": "Products created, ids are in input order",
+        },
+        **SERVICE_BUSY_RESPONSE,
+    },
+)
+async def post_products(args: list[PostProduct]):
+    product_ids = await service.post_products(args)
+    return FastJSONResponse(
+        content={"ids": product_ids}, status_code=status.HTTP_201_CREATED
+    )
+
+
+@router.put(
+    "/bulk",
+    responses={
+        200: {
+            "content": {"application/json": {"example": {"ids": [12, 13]}}},
+            "description": "Products updated, ids are in input order",
+        },
+        404: {"description": "Product not found"},
+        **SERVICE_BUSY_RESPONSE,
+    },
+)
+async def put_products(args: list[BulkPutProduct]):
+    try:
+        product_ids = await service.put_products(args)
+    except NotFoundError as e:
+        raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
+    return FastJSONResponse(
+        content={"ids": product_ids}, status_code=status.HTTP_200_OK
+    )
+
+
 @router.get("", include_in_schema=False)
 @router.get(
     "/",
@@ -48,13 +88,102 @@ async def post_product(args: PostProduct):
                 }
             },
             "description": "Ok",
+            "headers": {
+                "X-Next-Cursor": {
+                    "description": "Cursor for the next page, pass it as `after`",
+                    "schema": {"type": "string"},
+                }
+            },
+        },
+        400: {"description": "Invalid pagination cursor"},
+    },
+)
+async def get_products(
+    limit: int | None = None, offset: int = 0, after: str | None = None
+):
+    try:
+        products, next_cursor = await service.get_products(limit, offset, after)
+    except InvalidCursorError as e:
+        raise HTTPException(detail=e.args, status_code=status.HTTP_400_BAD_REQUEST)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor is not None else None
+    return FastJSONResponse(
+        content=products, status_code=status.HTTP_200_OK, headers=headers
+    )
+
+
+@router.get(
+    "/search",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": [
+                        {
+                            "product_id": 12,
+                            "name": "Name of product",
+                            "description": "Description",
+                            "price": 12.3,
+                            "quantity": 12,
+                            "created_at": "2024-09-20T12:00:00.000000",
+                            "updated_at": "2024-09-20T12:00:00.000000",
+                        }
+                    ]
+                }
+            },
+            "description": "Products matching every word of the query, best first",
+        },
+    },
+)
+async def search_products(
+    q: str,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    products = await service.search_products(q, limit, offset)
+    return FastJSONResponse(content=products, status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/stats",
+    responses={
+        200: {
+            "content": {
+                "application/json": {
+                    "example": {
+                        "products": 2,
+                        "total_stock": 13,
+                        "stock_value": 179.7,
+                        "low_stock": [
+                            {"product_id": 13, "name": "Product2", "quantity": 1}
+                        ],
+                    }
+                }
+            },
+            "description": "Ok",
+        },
+    },
+)
+async def get_product_stats(low_stock_threshold: int = 5, low_stock_limit: int = 100):
+    stats = await service.get_product_stats(low_stock_threshold, low_stock_limit)
+    return FastJSONResponse(content=stats, status_code=status.HTTP_200_OK)
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {
+            "content": {"application/x-ndjson": {}},
+            "description": "All products, one JSON object per line",
         },
     },
 )
-async def get_products(limit: int | None = None, offset: int = 0):
-    products = await service.get_products(limit, offset)
-    products_to_export = list(map(lambda x: x.as_dict(), products))
-    return JSONResponse(content=products_to_export, status_code=status.HTTP_200_OK)
+async def export_products():
+    async def lines():
+        async for product in service.export_products():
+            yield dumps(product) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @router.get(
@@ -84,7 +213,7 @@ async def get_product(id: int):
         product = await service.get_product(id)
     except NotFoundError as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
-    return JSONResponse(content=product.as_dict(), status_code=status.HTTP_200_OK)
+    return FastJSONResponse(content=product, status_code=status.HTTP_200_OK)
 
 
 @router.put(
@@ -107,6 +236,7 @@ async def get_product(id: int):
             "description": "Ok",
         },
         404: {"description": "Product not found"},
+        **SERVICE_BUSY_RESPONSE,
     },
 )
 async def put_product(args: PutProduct, id: Annotated[int, Path()]):
@@ -114,7 +244,9 @@ async def put_product(args: PutProduct, id: Annotated[int, Path()]):
         product = await service.put_product(id, args)
     except NotFoundError as e:
         raise HTTPException(detail=e.args, status_code=status.HTTP_404_NOT_FOUND)
-    return JSONResponse(content=product.as_dict(), status_code=status.HTTP_200_OK)
+    return FastJSONResponse(
+        content=product.as_dict(), status_code=status.HTTP_200_OK
+    )
 
 
 @router.delete(
@@ -122,6 +254,7 @@ async def put_product(args: PutProduct, id: Annotated[int, Path()]):
     responses={
         204: {"description": "Product deleted"},
         404: {"description": "Product not found"},
+        **SERVICE_BUSY_RESPONSE,
     },
 )
 async def delete_product(id: Annotated[int, Path()]):
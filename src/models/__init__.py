@@ -1,3 +1,10 @@
-from src.models.orders import Order
-from src.models.products import Product
+from src.models.orders import Order, serialize_order
+from src.models.products import Product, products_fts, serialize_product
 from src.models.order_items import OrderItem
+from src.models.order_stats import (
+    HourlyOrderStats,
+    ProductSalesStats,
+    serialize_hourly_order_stats,
+    serialize_product_sales_stats,
+)
+from src.models.idempotency_keys import IdempotencyKey
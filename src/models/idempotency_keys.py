@@ -0,0 +1,17 @@
+from datetime import datetime
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.types import EpochMicroseconds
+from src.services.db_session import SqlAlchemyBase
+
+
+class IdempotencyKey(SqlAlchemyBase):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = {"extend_existing": True}
+    key: Mapped[str] = mapped_column(primary_key=True)
+    order_id: Mapped[int] = mapped_column(ForeignKey("orders.order_id"), nullable=False)
+    expires_at: Mapped[datetime] = mapped_column(
+        EpochMicroseconds, nullable=False, index=True
+    )
@@ -8,11 +8,16 @@ class OrderItem(SqlAlchemyBase):
     __tablename__ = "order_items"
     __table_args__ = {"extend_existing": True}
     order_item_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    order_id: Mapped[int] = mapped_column(ForeignKey("orders.order_id"), nullable=False)
+    order_id: Mapped[int] = mapped_column(
+        ForeignKey("orders.order_id"), nullable=False, index=True
+    )
     product_id: Mapped[int] = mapped_column(
-        ForeignKey("products.product_id"), nullable=False
+        ForeignKey("products.product_id"), nullable=False, index=True
     )
     quantity: Mapped[int] = mapped_column(nullable=False, default=0)
+    # Product price when the order was placed and quantity * unit_price
+    unit_price: Mapped[float] = mapped_column(nullable=False, server_default="0")
+    line_total: Mapped[float] = mapped_column(nullable=False, server_default="0")
 
     order = relationship("Order", back_populates="order_items")
     product = relationship("Product")
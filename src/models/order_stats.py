@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped, mapped_column
+
+from src.models.serializers import compile_serializer
+from src.models.types import EpochMicroseconds
+from src.services.db_session import SqlAlchemyBase
+
+
+class HourlyOrderStats(SqlAlchemyBase):
+    __tablename__ = "order_hourly_stats"
+    __table_args__ = {"extend_existing": True}
+    bucket: Mapped[datetime] = mapped_column(EpochMicroseconds, primary_key=True)
+    status: Mapped[str] = mapped_column(primary_key=True)
+    orders: Mapped[int] = mapped_column(nullable=False, default=0)
+    units: Mapped[int] = mapped_column(nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(nullable=False, default=0.0)
+
+
+class ProductSalesStats(SqlAlchemyBase):
+    __tablename__ = "product_sales_stats"
+    __table_args__ = {"extend_existing": True}
+    product_id: Mapped[int] = mapped_column(primary_key=True)
+    status: Mapped[str] = mapped_column(primary_key=True)
+    orders: Mapped[int] = mapped_column(nullable=False, default=0)
+    units: Mapped[int] = mapped_column(nullable=False, default=0)
+    revenue: Mapped[float] = mapped_column(nullable=False, default=0.0)
+
+
+serialize_hourly_order_stats = compile_serializer(HourlyOrderStats.__table__)
+serialize_product_sales_stats = compile_serializer(ProductSalesStats.__table__)
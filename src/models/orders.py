@@ -1,19 +1,42 @@
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import JSON, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
+from src.models.serializers import compile_serializer
+from src.models.types import EpochMicroseconds
 from src.services.db_session import SqlAlchemyBase
 
 
 class Order(SqlAlchemyBase):
     __tablename__ = "orders"
-    __table_args__ = {"extend_existing": True}
+    __table_args__ = (
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        Index("ix_orders_status_updated_at", "status", "updated_at"),
+        {"extend_existing": True},
+    )
     order_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     status: Mapped[str] = mapped_column(nullable=False, default="created")
-    created_at: Mapped[str] = mapped_column(nullable=False)
-    updated_at: Mapped[str] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        EpochMicroseconds, nullable=False, index=True
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        EpochMicroseconds, nullable=False, index=True
+    )
+    # Sum of the items' line totals
+    total: Mapped[float] = mapped_column(nullable=False, server_default="0")
+    # [[product_id, product_name, quantity, line_total], ...] as of order creation,
+    # so orders are read without joining items and products. A snapshot like the
+    # prices: later renames and deletions of the products don't change it
+    items_summary: Mapped[list[list[Any]]] = mapped_column(
+        JSON, nullable=False, default=list, server_default="[]"
+    )
 
     order_items = relationship("OrderItem", back_populates="order")
 
     def as_dict(self) -> dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return serialize_order(self)
+
+
+serialize_order = compile_serializer(Order.__table__, exclude=("items_summary",))
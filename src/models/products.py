@@ -1,7 +1,11 @@
+from datetime import datetime
 from typing import Any
 
+from sqlalchemy import DDL, column, event, table
 from sqlalchemy.orm import Mapped, mapped_column
 
+from src.models.serializers import compile_serializer
+from src.models.types import EpochMicroseconds
 from src.services.db_session import SqlAlchemyBase
 
 
@@ -13,8 +17,49 @@ class Product(SqlAlchemyBase):
     description: Mapped[str] = mapped_column()
     price: Mapped[float] = mapped_column(nullable=False)
     quantity: Mapped[int] = mapped_column(nullable=False, default=0)
-    created_at: Mapped[str] = mapped_column(nullable=False)
-    updated_at: Mapped[str] = mapped_column(nullable=False)
+    created_at: Mapped[datetime] = mapped_column(EpochMicroseconds, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(EpochMicroseconds, nullable=False)
 
     def as_dict(self) -> dict[str, Any]:
-        return {c.name: getattr(self, c.name) for c in self.__table__.columns}
+        return serialize_product(self)
+
+
+serialize_product = compile_serializer(Product.__table__)
+
+
+# External content FTS5 index over products, kept in sync by triggers. It isn't
+# part of the metadata, so it's created alongside the products table
+products_fts = table("products_fts", column("rowid"), column("products_fts"))
+
+PRODUCTS_FTS_DDL = (
+    """
+    CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, content='products', content_rowid='product_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.product_id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.product_id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description
+    ON products BEGIN
+        INSERT INTO products_fts (products_fts, rowid, name, description)
+        VALUES ('delete', old.product_id, old.name, old.description);
+        INSERT INTO products_fts (rowid, name, description)
+        VALUES (new.product_id, new.name, new.description);
+    END
+    """,
+)
+
+for statement in PRODUCTS_FTS_DDL:
+    event.listen(Product.__table__, "after_create", DDL(statement))
@@ -0,0 +1,24 @@
+from datetime import datetime
+from operator import attrgetter
+from typing import Any, Callable
+
+from sqlalchemy import Table
+
+
+def compile_serializer(
+    table: Table, exclude: tuple[str, ...] = ()
+) -> Callable[[Any], dict[str, Any]]:
+    # Works for ORM instances and for rows selected from the table's columns
+    columns = [c for c in table.columns if c.name not in exclude]
+    names = tuple(c.name for c in columns)
+    datetime_names = tuple(c.name for c in columns if c.type.python_type is datetime)
+    getter = attrgetter(*names)
+
+    def serialize(obj: Any) -> dict[str, Any]:
+        values = dict(zip(names, getter(obj)))
+        for name in datetime_names:
+            if values[name] is not None:
+                values[name] = values[name].isoformat()
+        return values
+
+    return serialize
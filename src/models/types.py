@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import BigInteger, TypeDecorator
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value: datetime) -> int:
+    # Naive datetimes are local time, as produced by datetime.now()
+    return (value.astimezone(timezone.utc) - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(value: int) -> datetime:
+    return (EPOCH + value * MICROSECOND).astimezone().replace(tzinfo=None)
+
+
+class EpochMicroseconds(TypeDecorator):
+    impl = BigInteger
+    cache_ok = True
+
+    @property
+    def python_type(self) -> type:
+        return datetime
+
+    def process_bind_param(self, value: datetime | None, dialect) -> int | None:
+        return None if value is None else to_epoch_us(value)
+
+    def process_result_value(self, value: int | None, dialect) -> datetime | None:
+        return None if value is None else from_epoch_us(value)
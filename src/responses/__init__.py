@@ -0,0 +1,2 @@
+from src.responses.json_response import FastJSONResponse, dumps
+from src.responses.service_busy import SERVICE_BUSY_RESPONSE, service_busy_handler
@@ -0,0 +1,26 @@
+from fastapi import Request, status
+
+from src.exceptions import ServiceBusyError
+from src.responses.json_response import FastJSONResponse
+
+SERVICE_BUSY_RESPONSE = {
+    503: {
+        "description": "Too many pending writes, retry later",
+        "headers": {
+            "Retry-After": {
+                "description": "Seconds to wait before retrying",
+                "schema": {"type": "integer"},
+            }
+        },
+    },
+}
+
+
+async def service_busy_handler(
+    request: Request, exc: ServiceBusyError
+) -> FastJSONResponse:
+    return FastJSONResponse(
+        content={"detail": exc.args},
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
@@ -1 +1,5 @@
-from src.routes.routes import register_routes
+from src.routes.routes import (
+    register_routes,
+    register_exception_handlers,
+    register_middleware,
+)
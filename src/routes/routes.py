@@ -1,9 +1,25 @@
 from fastapi import FastAPI
 
+from src.exceptions import ServiceBusyError
 from src.handlers.product_handler import router as product_router
 from src.handlers.order_handler import router as order_router
+from src.handlers.metrics_handler import router as metrics_router
+from src.handlers.debug_handler import router as debug_router
+from src.responses import service_busy_handler
+from src.routes.middleware import MetricsMiddleware, RequestScopeMiddleware
 
 
 def register_routes(app: FastAPI) -> None:
     app.include_router(product_router, prefix="/products", tags=["Work with products"])
     app.include_router(order_router, prefix="/orders", tags=["Work with orders"])
+    app.include_router(metrics_router, prefix="/metrics", tags=["Monitoring"])
+    app.include_router(debug_router, prefix="/debug", tags=["Monitoring"])
+
+
+def register_exception_handlers(app: FastAPI) -> None:
+    app.add_exception_handler(ServiceBusyError, service_busy_handler)
+
+
+def register_middleware(app: FastAPI) -> None:
+    app.add_middleware(MetricsMiddleware)
+    app.add_middleware(RequestScopeMiddleware)
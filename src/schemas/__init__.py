@@ -1,2 +1,2 @@
-from src.schemas.product_schema import PostProduct, PutProduct
-from src.schemas.order_schema import PostOrder
+from src.schemas.product_schema import PostProduct, PutProduct, BulkPutProduct
+from src.schemas.order_schema import PostOrder, OrderFilter
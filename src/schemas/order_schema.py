@@ -1,6 +1,15 @@
+from datetime import datetime
+
 from pydantic import BaseModel
 
 
 class PostOrder(BaseModel):
     items: dict[int, int]
     status: str = "Created"
+
+
+class OrderFilter(BaseModel):
+    status: str | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    updated_since: datetime | None = None
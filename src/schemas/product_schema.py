@@ -13,3 +13,7 @@ class PutProduct(BaseModel):
     description: str | None = None
     price: float | None = None
     quantity: int | None = None
+
+
+class BulkPutProduct(PutProduct):
+    product_id: int
@@ -1,3 +1,5 @@
 from src.models.order_items import OrderItem
 from src.models.orders import Order
 from src.models.products import Product
+from src.models.order_stats import HourlyOrderStats, ProductSalesStats
+from src.models.idempotency_keys import IdempotencyKey
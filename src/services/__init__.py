@@ -1 +1,7 @@
-from src.services.db_session import base_init, create_session, clear_all_rows
+from src.services.db_session import (
+    base_init,
+    create_session,
+    create_read_session,
+    begin_immediate,
+    clear_all_rows,
+)
@@ -0,0 +1,116 @@
+import asyncio
+import functools
+import random
+from collections import deque
+from typing import Any, Awaitable, Callable, TypeVar
+
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+from src.exceptions import ServiceBusyError
+
+R = TypeVar("R")
+
+
+def _is_busy(error: OperationalError) -> bool:
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database is busy" in message
+
+
+# Caps the number of writes in flight. Up to max_waiting callers wait for a slot
+# in arrival order, the rest are rejected immediately instead of piling up on
+# the writer connection. Writes that hit SQLITE_BUSY are retried with jitter.
+# The writer pool holds a single connection, so more concurrent writes would
+# only queue for it, unbounded, until the pool times out.
+class WriteLimiter:
+    def __init__(
+        self,
+        max_concurrency: int = 1,
+        max_waiting: int = 64,
+        retries: int = 3,
+        retry_delay: float = 0.05,
+        retry_after: int = 1,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_after = retry_after
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._active = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def run(self, func: Callable[..., Awaitable[R]], *args, **kwargs) -> R:
+        await self._acquire()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except PoolTimeoutError as e:
+                    raise ServiceBusyError(
+                        "Timed out waiting for the database", self.retry_after
+                    ) from e
+                except OperationalError as e:
+                    if not _is_busy(e):
+                        raise
+                    if attempt == self.retries:
+                        raise ServiceBusyError(
+                            "Database is busy, try again later", self.retry_after
+                        ) from e
+                await asyncio.sleep(random.uniform(0, self.retry_delay * 2**attempt))
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._active = 0
+            self._waiters = deque()
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+        if len(self._waiters) >= self.max_waiting:
+            raise ServiceBusyError("Too many pending writes", self.retry_after)
+
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+
+
+__limiter = WriteLimiter()
+
+
+def configure_write_admission(**settings: Any) -> None:
+    global __limiter
+    __limiter = WriteLimiter(**settings)
+
+
+def admit_queued(pending: int) -> None:
+    # Queued writes are applied in batches holding a single slot, so rather than
+    # a slot each they need room in the queue, bounded by the same max_waiting
+    if pending >= __limiter.max_waiting:
+        raise ServiceBusyError("Too many pending writes", __limiter.retry_after)
+
+
+def admit_write(func: Callable[..., Awaitable[R]]) -> Callable[..., Awaitable[R]]:
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs) -> R:
+        return await __limiter.run(func, *args, **kwargs)
+
+    return wrapper
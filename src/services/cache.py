@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # Bumped by every invalidation; readers note it before loading a value
+        self.generation = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Generation of the latest invalidation of each key, bounded like _data
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        # Generation of the latest invalidation that may have hit any key
+        self._invalidated_all = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, generation: int | None = None) -> None:
+        # Readers pass the generation seen before loading: a value loaded across
+        # an invalidation of its key may be stale. Writers pass none and
+        # invalidate loads of the key.
+        if generation is None:
+            self._invalidate(key)
+        elif (
+            generation < self._invalidated_all
+            or generation < self._invalidated.get(key, 0)
+        ):
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._invalidate(key)
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._invalidate_all()
+        self._data.clear()
+        self._invalidated.clear()
+
+    def _invalidate(self, key: Hashable) -> None:
+        self.generation += 1
+        self._invalidated[key] = self.generation
+        self._invalidated.move_to_end(key)
+        if len(self._invalidated) > self.maxsize:
+            # Forgetting a key's stamp is safe once older loads of any key are
+            # rejected
+            _, generation = self._invalidated.popitem(last=False)
+            self._invalidated_all = max(self._invalidated_all, generation)
+
+    def _invalidate_all(self) -> None:
+        self.generation += 1
+        self._invalidated_all = self.generation
+
+
+product_cache = TTLCache(maxsize=4096, ttl=60.0)
+order_cache = TTLCache(maxsize=16384, ttl=300.0)
+
+
+def clear_caches() -> None:
+    product_cache.clear()
+    order_cache.clear()
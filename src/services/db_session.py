@@ -1,18 +1,60 @@
 import asyncio
 from pathlib import Path
+from typing import Any
 
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
 from sqlalchemy.orm import Session
 import sqlalchemy.ext.declarative as dec
 
+from src.services.cache import clear_caches
+from src.services.metrics import instrument_engine, timed_pool
+from src.services.slow_queries import watch_engine
+
 
 SqlAlchemyBase = dec.declarative_base()
 __factory = None
+__read_factory = None
 
 
-def base_init(db_file: Path | str):
-    global __factory
+SQLITE_PRAGMAS = (
+    "journal_mode",
+    "synchronous",
+    "mmap_size",
+    "cache_size",
+    "temp_store",
+    "busy_timeout",
+)
+
+
+# Persistent database settings that a read-only connection can't change
+WRITER_ONLY_PRAGMAS = ("journal_mode",)
+
+
+def _set_pragmas(engine: AsyncEngine, pragmas: dict[str, Any]) -> None:
+    unknown = set(pragmas) - set(SQLITE_PRAGMAS)
+    if unknown:
+        raise ValueError(f"Unsupported SQLite pragmas: {sorted(unknown)}")
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def base_init(
+    db_file: Path | str,
+    pragmas: dict[str, Any] | None = None,
+    read_pool_size: int = 5,
+):
+    global __factory, __read_factory
     if __factory:
         return
     if not isinstance(db_file, Path):
@@ -20,25 +62,71 @@ def base_init(db_file: Path | str):
     db_file.parent.mkdir(parents=True, exist_ok=True)
     conn_str = f"sqlite+aiosqlite:///{db_file}?check_same_thread=False"
     print(f"Connection to base {db_file}\n")
-    engine = create_async_engine(conn_str, echo=False)
+    # SQLite allows a single writer, so writes queue for one pooled connection
+    engine = create_async_engine(
+        conn_str,
+        echo=False,
+        pool_size=1,
+        max_overflow=0,
+        poolclass=timed_pool("writer"),
+    )
+    instrument_engine(engine, "writer")
+    watch_engine(engine, "writer")
+    if pragmas:
+        _set_pragmas(engine, pragmas)
     __factory = async_sessionmaker(bind=engine, expire_on_commit=False)
     from src.services import __all_models__
+    from src.services.migrations import migrate
 
     async def init_models():
         async with engine.begin() as conn:
-            await conn.run_sync(SqlAlchemyBase.metadata.create_all)
+            await conn.run_sync(migrate)
 
     asyncio.run(init_models())
 
+    read_conn_str = (
+        f"sqlite+aiosqlite:///file:{db_file.resolve().as_posix()}"
+        "?mode=ro&uri=true&check_same_thread=False"
+    )
+    read_engine = create_async_engine(
+        read_conn_str,
+        echo=False,
+        pool_size=read_pool_size,
+        max_overflow=0,
+        poolclass=timed_pool("reader"),
+    )
+    instrument_engine(read_engine, "reader")
+    watch_engine(read_engine, "reader")
+    if pragmas:
+        read_pragmas = {
+            name: value
+            for name, value in pragmas.items()
+            if name not in WRITER_ONLY_PRAGMAS
+        }
+        _set_pragmas(read_engine, read_pragmas)
+    __read_factory = async_sessionmaker(bind=read_engine, expire_on_commit=False)
+
 
 def create_session() -> Session:
     global __factory
     return __factory()
 
 
+def create_read_session() -> Session:
+    global __read_factory
+    return __read_factory()
+
+
+async def begin_immediate(session: AsyncSession) -> None:
+    # pysqlite only opens a transaction before DML, so a SAVEPOINT issued first
+    # would become the outermost transaction and commit on release
+    await session.execute(text("BEGIN IMMEDIATE"))
+
+
 async def clear_all_rows():
     async with create_session() as session:
         async with session.begin():
             for model in SqlAlchemyBase.__subclasses__():
                 await session.execute(text(f"DELETE FROM {model.__tablename__}"))
             await session.commit()
+    clear_caches()
@@ -0,0 +1,285 @@
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import Connection, inspect
+
+from src.models.types import to_epoch_us
+from src.services.db_session import SqlAlchemyBase
+
+
+def _add_lookup_indexes(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_order_items_order_id ON order_items (order_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_order_items_product_id "
+        "ON order_items (product_id)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_orders_status_created_at "
+        "ON orders (status, created_at)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_orders_updated_at ON orders (updated_at)"
+    )
+
+
+def _iso_to_epoch_us(value: str | int | None) -> int | None:
+    if value is None or isinstance(value, int):
+        return value
+    return to_epoch_us(datetime.fromisoformat(value))
+
+
+def _epoch_timestamps(conn: Connection) -> None:
+    # SQLite can't change a column type in place, so copy each table into one
+    # with integer columns and swap it in
+    conn.connection.dbapi_connection.create_function(
+        "iso_to_epoch_us", 1, _iso_to_epoch_us, deterministic=True
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE orders_new (
+            order_id INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            created_at BIGINT NOT NULL,
+            updated_at BIGINT NOT NULL,
+            PRIMARY KEY (order_id)
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO orders_new (order_id, status, created_at, updated_at)
+        SELECT order_id, status,
+            iso_to_epoch_us(created_at), iso_to_epoch_us(updated_at)
+        FROM orders
+        """
+    )
+    conn.exec_driver_sql("DROP TABLE orders")
+    conn.exec_driver_sql("ALTER TABLE orders_new RENAME TO orders")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_orders_status_created_at ON orders (status, created_at)"
+    )
+    conn.exec_driver_sql("CREATE INDEX ix_orders_updated_at ON orders (updated_at)")
+
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE products_new (
+            product_id INTEGER NOT NULL,
+            name VARCHAR NOT NULL,
+            description VARCHAR NOT NULL,
+            price FLOAT NOT NULL,
+            quantity INTEGER NOT NULL,
+            created_at BIGINT NOT NULL,
+            updated_at BIGINT NOT NULL,
+            PRIMARY KEY (product_id)
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO products_new
+        SELECT product_id, name, description, price, quantity,
+            iso_to_epoch_us(created_at), iso_to_epoch_us(updated_at)
+        FROM products
+        """
+    )
+    conn.exec_driver_sql("DROP TABLE products")
+    conn.exec_driver_sql("ALTER TABLE products_new RENAME TO products")
+
+
+def _order_rollups(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE order_hourly_stats (
+            bucket BIGINT NOT NULL,
+            status VARCHAR NOT NULL,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue FLOAT NOT NULL,
+            PRIMARY KEY (bucket, status)
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE product_sales_stats (
+            product_id INTEGER NOT NULL,
+            status VARCHAR NOT NULL,
+            orders INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            revenue FLOAT NOT NULL,
+            PRIMARY KEY (product_id, status)
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO order_hourly_stats (bucket, status, orders, units, revenue)
+        SELECT (orders.created_at / 3600000000) * 3600000000, orders.status,
+            count(DISTINCT orders.order_id), coalesce(sum(order_items.quantity), 0),
+            coalesce(sum(order_items.quantity * products.price), 0.0)
+        FROM orders
+        LEFT JOIN order_items ON order_items.order_id = orders.order_id
+        LEFT JOIN products ON products.product_id = order_items.product_id
+        GROUP BY 1, 2
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO product_sales_stats (product_id, status, orders, units, revenue)
+        SELECT order_items.product_id, orders.status,
+            count(DISTINCT orders.order_id), coalesce(sum(order_items.quantity), 0),
+            coalesce(sum(order_items.quantity * products.price), 0.0)
+        FROM orders
+        JOIN order_items ON order_items.order_id = orders.order_id
+        LEFT JOIN products ON products.product_id = order_items.product_id
+        GROUP BY 1, 2
+        """
+    )
+
+
+def _idempotency_keys(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        """
+        CREATE TABLE idempotency_keys (
+            "key" VARCHAR NOT NULL,
+            order_id INTEGER NOT NULL,
+            expires_at BIGINT NOT NULL,
+            PRIMARY KEY ("key"),
+            FOREIGN KEY(order_id) REFERENCES orders (order_id)
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_idempotency_keys_expires_at ON idempotency_keys (expires_at)"
+    )
+
+
+def _product_search(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        """
+        CREATE VIRTUAL TABLE products_fts USING fts5(
+            name, description, content='products', content_rowid='product_id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts (rowid, name, description)
+            VALUES (new.product_id, new.name, new.description);
+        END
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description)
+            VALUES ('delete', old.product_id, old.name, old.description);
+        END
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        CREATE TRIGGER products_fts_update AFTER UPDATE OF name, description
+        ON products BEGIN
+            INSERT INTO products_fts (products_fts, rowid, name, description)
+            VALUES ('delete', old.product_id, old.name, old.description);
+            INSERT INTO products_fts (rowid, name, description)
+            VALUES (new.product_id, new.name, new.description);
+        END
+        """
+    )
+    conn.exec_driver_sql("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+
+
+def _order_items_summary(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "ALTER TABLE orders ADD COLUMN items_summary JSON DEFAULT '[]' NOT NULL"
+    )
+    # Prices at order time weren't recorded, so line totals use current prices
+    conn.exec_driver_sql(
+        """
+        UPDATE orders SET items_summary = (
+            SELECT json_group_array(json_array(
+                products.product_id, products.name, order_items.quantity,
+                order_items.quantity * products.price
+            ))
+            FROM order_items
+            JOIN products ON products.product_id = order_items.product_id
+            WHERE order_items.order_id = orders.order_id
+        )
+        """
+    )
+
+
+def _order_totals(conn: Connection) -> None:
+    conn.exec_driver_sql(
+        "ALTER TABLE order_items ADD COLUMN unit_price FLOAT DEFAULT '0' NOT NULL"
+    )
+    conn.exec_driver_sql(
+        "ALTER TABLE order_items ADD COLUMN line_total FLOAT DEFAULT '0' NOT NULL"
+    )
+    conn.exec_driver_sql(
+        "ALTER TABLE orders ADD COLUMN total FLOAT DEFAULT '0' NOT NULL"
+    )
+    # Prices at order time weren't recorded, so existing items get current prices
+    conn.exec_driver_sql(
+        """
+        UPDATE order_items SET
+            unit_price = products.price,
+            line_total = order_items.quantity * products.price
+        FROM products
+        WHERE products.product_id = order_items.product_id
+        """
+    )
+    conn.exec_driver_sql(
+        """
+        UPDATE orders SET total = (
+            SELECT coalesce(sum(order_items.line_total), 0.0)
+            FROM order_items
+            WHERE order_items.order_id = orders.order_id
+        )
+        """
+    )
+
+
+def _order_filter_indexes(conn: Connection) -> None:
+    conn.exec_driver_sql("CREATE INDEX ix_orders_created_at ON orders (created_at)")
+    conn.exec_driver_sql(
+        "CREATE INDEX ix_orders_status_updated_at ON orders (status, updated_at)"
+    )
+
+
+# Step N upgrades a database from schema version N to N + 1, append only. Steps
+# spell out their DDL instead of using the models, which later steps change
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    _add_lookup_indexes,
+    _epoch_timestamps,
+    _order_rollups,
+    _idempotency_keys,
+    _product_search,
+    _order_items_summary,
+    _order_totals,
+    _order_filter_indexes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn: Connection) -> None:
+    # pysqlite doesn't wrap DDL in a transaction, so open one explicitly to
+    # apply the steps and the version bump atomically
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    if not inspect(conn).has_table("orders"):
+        SqlAlchemyBase.metadata.create_all(conn)
+    elif version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than {SCHEMA_VERSION}"
+        )
+    else:
+        for step in MIGRATIONS[version:]:
+            step(conn)
+    conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
@@ -1,95 +1,394 @@
-from datetime import datetime
-from typing import Any
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Iterable
 
-from sqlalchemy import select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import (
+    BigInteger,
+    Row,
+    Select,
+    bindparam,
+    delete,
+    distinct,
+    func,
+    insert,
+    select,
+    tuple_,
+    type_coerce,
+    update,
+)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute
 
 from src.exceptions import NotFoundError, NotEnoughProduct
-from src.models import Order, Product, OrderItem
-from src.schemas import PostOrder
-from src.services import create_session
+from src.models import IdempotencyKey, Order, Product, OrderItem, serialize_order
+from src.schemas import PostOrder, OrderFilter
+from src.services import begin_immediate, create_read_session, create_session
+from src.services.admission import admit_queued, admit_write
+from src.services.cache import order_cache, product_cache
+from src.services.pagination import decode_cursor, decode_keyset_cursor, next_cursor
+from src.services.rollup_service import apply_order_rollups
+from src.services.write_queue import GroupCommitQueue
 
+EXPORT_CHUNK_SIZE = 1000
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+__write_queue: GroupCommitQueue[tuple[PostOrder, str | None], Order] | None = None
 
-async def post_order(args: PostOrder) -> Order:
-    async with create_session() as session:
-        order = Order(
-            status=args.status,
-            created_at=datetime.now().isoformat(),
-            updated_at=datetime.now().isoformat(),
-        )
-        session.add(order)
-
-        for product_id, quantity in args.items.items():
-            product = await session.get(Product, product_id)
-            if product is None:
-                raise NotFoundError(f"Can't find product with id {product_id}")
-            if product.quantity < quantity:
-                raise NotEnoughProduct(
-                    f"Not enough product with id {product_id} ({product.quantity}/{quantity})"
-                )
-            product.quantity -= quantity
 
-            order_item = OrderItem(
-                order_id=order.order_id, product_id=product_id, quantity=quantity
+async def _load_products(
+    session: AsyncSession, product_ids: Iterable[int]
+) -> dict[int, Row]:
+    query = select(
+        Product.product_id, Product.name, Product.price, Product.quantity
+    ).where(Product.product_id.in_(product_ids))
+    return {row.product_id: row for row in await session.execute(query)}
+
+
+def _stock(products: dict[int, Row]) -> dict[int, int]:
+    return {product_id: row.quantity for product_id, row in products.items()}
+
+
+def _check_stock(
+    stock: dict[int, int], items: dict[int, int]
+) -> NotFoundError | NotEnoughProduct | None:
+    for product_id, quantity in items.items():
+        if product_id not in stock:
+            return NotFoundError(f"Can't find product with id {product_id}")
+        if stock[product_id] < quantity:
+            return NotEnoughProduct(
+                f"Not enough product with id {product_id} ({stock[product_id]}/{quantity})"
             )
-            session.add(order_item)
+    return None
+
+
+async def _decrement_stock(session: AsyncSession, items: dict[int, int]) -> bool:
+    if not items:
+        return True
+    products = Product.__table__
+    query = (
+        update(products)
+        .where(
+            products.c.product_id == bindparam("b_product_id"),
+            products.c.quantity >= bindparam("b_quantity"),
+        )
+        .values(quantity=products.c.quantity - bindparam("b_quantity"))
+    )
+    result = await session.execute(
+        query,
+        [
+            {"b_product_id": product_id, "b_quantity": quantity}
+            for product_id, quantity in items.items()
+        ],
+    )
+    return result.rowcount == len(items)
+
+
+async def _insert_order(
+    session: AsyncSession, args: PostOrder, products: dict[int, Row]
+) -> Order:
+    items = [
+        {
+            "product_id": product_id,
+            "quantity": quantity,
+            "unit_price": products[product_id].price,
+            "line_total": quantity * products[product_id].price,
+        }
+        for product_id, quantity in args.items.items()
+    ]
+    order = Order(
+        status=args.status,
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        total=sum(item["line_total"] for item in items),
+        items_summary=[
+            [
+                item["product_id"],
+                products[item["product_id"]].name,
+                item["quantity"],
+                item["line_total"],
+            ]
+            for item in items
+        ],
+    )
+    session.add(order)
+    await session.flush()
+
+    if items:
+        await session.execute(
+            insert(OrderItem), [{"order_id": order.order_id, **item} for item in items]
+        )
+    return order
+
+
+async def _find_idempotent_order(session: AsyncSession, key: str) -> Order | None:
+    query = (
+        select(Order)
+        .join(IdempotencyKey, IdempotencyKey.order_id == Order.order_id)
+        .where(IdempotencyKey.key == key, IdempotencyKey.expires_at >= datetime.now())
+    )
+    return (await session.scalars(query)).first()
+
+
+async def _claim_idempotency_key(
+    session: AsyncSession, key: str, order_id: int
+) -> None:
+    now = datetime.now()
+    await session.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < now))
+    await session.execute(
+        insert(IdempotencyKey).values(
+            key=key, order_id=order_id, expires_at=now + IDEMPOTENCY_KEY_TTL
+        )
+    )
+
+
+async def post_order(args: PostOrder, idempotency_key: str | None = None) -> Order:
+    if idempotency_key is not None:
+        async with create_read_session() as session:
+            order = await _find_idempotent_order(session, idempotency_key)
+        if order is not None:
+            return order
+    if __write_queue is not None:
+        admit_queued(__write_queue.pending)
+        return await __write_queue.submit((args, idempotency_key))
+    return await _place_order(args, idempotency_key)
+
+
+@admit_write
+async def _place_order(args: PostOrder, idempotency_key: str | None) -> Order:
+    async with create_session() as session:
+        if idempotency_key is not None:
+            # The writer connection is exclusive, so this check can't race with
+            # the original request the way the read pool lookup above can
+            order = await _find_idempotent_order(session, idempotency_key)
+            if order is not None:
+                return order
+        products = await _load_products(session, args.items)
+        error = _check_stock(_stock(products), args.items)
+        if error is not None:
+            raise error
+
+        order = await _insert_order(session, args, products)
+        if idempotency_key is not None:
+            try:
+                await _claim_idempotency_key(session, idempotency_key, order.order_id)
+            except IntegrityError:
+                # A concurrent request with the same key committed first
+                await session.rollback()
+                return await _find_idempotent_order(session, idempotency_key)
+
+        if not await _decrement_stock(session, args.items):
+            raise NotEnoughProduct("Not enough product to create order")
+        await apply_order_rollups(session, order.order_id, order.status)
 
-        await session.flush()
         await session.commit()
+        for product_id in args.items:
+            product_cache.pop(product_id)
         return order
 
 
-async def get_orders(limit: int | None = None, offset: int = 0) -> list[dict[str, Any]]:
+@admit_write
+async def post_orders(
+    args: list[PostOrder], idempotency_keys: list[str | None] | None = None
+) -> list[Order | NotFoundError | NotEnoughProduct]:
+    if idempotency_keys is None:
+        idempotency_keys = [None] * len(args)
     async with create_session() as session:
-        query = (
-            select(Order)
-            .options(joinedload(Order.order_items).joinedload(OrderItem.product))
-        )
-        results = (await session.scalars(query)).unique().all()
-
-        orders_list = []
-        for order in results:
-            order_dict = order.as_dict()
-            order_dict["order_items"] = {}
-            for item in order.order_items:
-                product_name = item.product.name
-                product_quantity = item.quantity
-                order_dict["order_items"][product_name] = product_quantity
-            orders_list.append(order_dict)
+        await begin_immediate(session)
+        product_ids = {id for order_args in args for id in order_args.items}
+        products = await _load_products(session, product_ids)
+        stock = _stock(products)
+
+        results: list[Order | NotFoundError | NotEnoughProduct] = []
+        for order_args, key in zip(args, idempotency_keys):
+            if key is not None:
+                order = await _find_idempotent_order(session, key)
+                if order is not None:
+                    results.append(order)
+                    continue
+            error = _check_stock(stock, order_args.items)
+            if error is not None:
+                results.append(error)
+                continue
+            try:
+                async with session.begin_nested():
+                    order = await _insert_order(session, order_args, products)
+                    if key is not None:
+                        await _claim_idempotency_key(session, key, order.order_id)
+                    if not await _decrement_stock(session, order_args.items):
+                        raise NotEnoughProduct("Not enough product to create order")
+                    await apply_order_rollups(session, order.order_id, order.status)
+            except NotEnoughProduct as e:
+                results.append(e)
+                continue
+            for product_id, quantity in order_args.items.items():
+                stock[product_id] -= quantity
+            results.append(order)
+
+        await session.commit()
+        for product_id in product_ids:
+            product_cache.pop(product_id)
+        return results
+
+
+async def _post_queued_orders(
+    items: list[tuple[PostOrder, str | None]]
+) -> list[Order | NotFoundError | NotEnoughProduct]:
+    return await post_orders([args for args, _ in items], [key for _, key in items])
+
+
+def configure_write_batching(enabled: bool, max_batch_size: int = 100) -> None:
+    global __write_queue
+    if __write_queue is not None:
+        __write_queue.close()
+    __write_queue = (
+        GroupCommitQueue(_post_queued_orders, max_batch_size) if enabled else None
+    )
+
+
+def _order_to_dict(order: Order | Row) -> dict[str, Any]:
+    order_dict = serialize_order(order)
+    order_dict["order_items"] = {
+        product_name: quantity
+        for _, product_name, quantity, _ in order.items_summary
+    }
+    return order_dict
+
+
+def _filter_orders(query: Select, filters: OrderFilter) -> Select:
+    if filters.status is not None:
+        query = query.where(Order.status == filters.status)
+    if filters.created_from is not None:
+        query = query.where(Order.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(Order.created_at < filters.created_to)
+    if filters.updated_since is not None:
+        query = query.where(Order.updated_at >= filters.updated_since)
+    return query
+
+
+def _sort_column(filters: OrderFilter | None) -> InstrumentedAttribute | None:
+    # Filtered pages are keyset-paginated on the timestamp the matching index
+    # is ordered by, so they're read off the index instead of sorted
+    if filters is None:
+        return None
+    if filters.updated_since is not None:
+        return Order.updated_at
+    if (
+        filters.status is not None
+        or filters.created_from is not None
+        or filters.created_to is not None
+    ):
+        return Order.created_at
+    return None
+
+
+async def get_orders(
+    limit: int | None = None,
+    offset: int = 0,
+    after: str | None = None,
+    filters: OrderFilter | None = None,
+) -> tuple[list[dict[str, Any]], str | None]:
+    async with create_read_session() as session:
+        sort_column = _sort_column(filters)
+        if sort_column is None:
+            query = select(*Order.__table__.columns).order_by(Order.order_id)
+            if after is not None:
+                query = query.where(Order.order_id > decode_cursor(after))
+        else:
+            sort_key = type_coerce(sort_column, BigInteger)
+            query = select(*Order.__table__.columns, sort_key.label("sort_key"))
+            query = query.order_by(sort_key, Order.order_id)
+            if after is not None:
+                query = query.where(
+                    tuple_(sort_key, Order.order_id)
+                    > tuple_(*decode_keyset_cursor(after, 2))
+                )
+        if filters is not None:
+            query = _filter_orders(query, filters)
         if limit is not None:
-            orders_list = orders_list[offset : offset + limit]
-        return orders_list
+            query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
+        rows = (await session.execute(query)).all()
 
+        orders_list = [_order_to_dict(row) for row in rows]
+        if sort_column is None:
+            return orders_list, next_cursor(orders_list, "order_id", limit)
+        page = [row._mapping for row in rows]
+        return orders_list, next_cursor(page, ("sort_key", "order_id"), limit)
 
-async def get_order(id: int) -> dict[str, Any]:
-    async with create_session() as session:
+
+async def export_orders() -> AsyncIterator[dict[str, Any]]:
+    async with create_read_session() as session:
         query = (
-            select(Order)
-            .options(joinedload(Order.order_items).joinedload(OrderItem.product))
-            .where(Order.order_id == id)
+            select(*Order.__table__.columns)
+            .order_by(Order.order_id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
         )
-        order = (await session.scalars(query)).first()
+        async for row in await session.stream(query):
+            yield _order_to_dict(row)
 
-        if order is None:
+
+async def get_order_stats(filters: OrderFilter | None = None) -> dict[str, Any]:
+    async with create_read_session() as session:
+        orders_count = func.count(distinct(Order.order_id)).label("orders")
+        units = func.coalesce(func.sum(OrderItem.quantity), 0).label("units")
+        created_us = type_coerce(Order.created_at, BigInteger)
+        day = func.date(created_us / 1_000_000, "unixepoch", "localtime").label("day")
+
+        def orders_query(*columns) -> Select:
+            query = select(*columns, orders_count, units).select_from(Order)
+            query = query.outerjoin(OrderItem, OrderItem.order_id == Order.order_id)
+            return _filter_orders(query, filters) if filters is not None else query
+
+        by_status = await session.execute(
+            orders_query(Order.status).group_by(Order.status).order_by(Order.status)
+        )
+        by_day = await session.execute(orders_query(day).group_by(day).order_by(day))
+        by_product = await session.execute(
+            orders_query(OrderItem.product_id, Product.name)
+            .outerjoin(Product, Product.product_id == OrderItem.product_id)
+            .where(OrderItem.product_id.is_not(None))
+            .group_by(OrderItem.product_id)
+            .order_by(OrderItem.product_id)
+        )
+        return {
+            "by_status": [dict(row) for row in by_status.mappings()],
+            "by_day": [dict(row) for row in by_day.mappings()],
+            "by_product": [dict(row) for row in by_product.mappings()],
+        }
+
+
+async def get_order(id: int) -> dict[str, Any]:
+    cached = order_cache.get(id)
+    if cached is not None:
+        return cached
+
+    generation = order_cache.generation
+    async with create_read_session() as session:
+        query = select(*Order.__table__.columns).where(Order.order_id == id)
+        row = (await session.execute(query)).first()
+
+        if row is None:
             raise NotFoundError("Can't find order with this id")
 
-        order_dict = order.as_dict()
-        order_dict["order_items"] = {}
-        for item in order.order_items:
-            product_name = item.product.name
-            product_quantity = item.quantity
-            order_dict["order_items"][product_name] = product_quantity
-        return order_dict
+        order_dict = _order_to_dict(row)
+    order_cache.set(id, order_dict, generation)
+    return order_dict
 
 
+@admit_write
 async def set_order_status(id: int, status: str) -> Order:
     async with create_session() as session:
         order = await session.get(Order, id)
         if order is None:
             raise NotFoundError("Can't find order with this id")
 
+        if order.status != status:
+            await apply_order_rollups(session, order.order_id, order.status, sign=-1)
+            await apply_order_rollups(session, order.order_id, status)
         order.status = status
-        order.updated_at = datetime.now().isoformat()
+        order.updated_at = datetime.now()
 
         await session.commit()
+        order_cache.pop(id)
         return order
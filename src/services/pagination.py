@@ -0,0 +1,42 @@
+import base64
+import binascii
+from typing import Any, Mapping, Sequence
+
+from src.exceptions import InvalidCursorError
+
+# SQLite INTEGER range, larger values can't be bound as query parameters
+MIN_CURSOR_ID = -(2**63)
+MAX_CURSOR_ID = 2**63 - 1
+
+
+def encode_cursor(*values: int) -> str:
+    text = ",".join(str(value) for value in values)
+    return base64.urlsafe_b64encode(text.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    (last_id,) = decode_keyset_cursor(cursor, 1)
+    return last_id
+
+
+def decode_keyset_cursor(cursor: str, size: int) -> tuple[int, ...]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        text = base64.urlsafe_b64decode(padded.encode()).decode()
+        values = tuple(int(value) for value in text.split(","))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursorError("Invalid pagination cursor")
+    if len(values) != size or not all(
+        MIN_CURSOR_ID <= value <= MAX_CURSOR_ID for value in values
+    ):
+        raise InvalidCursorError("Invalid pagination cursor")
+    return values
+
+
+def next_cursor(
+    page: Sequence[Mapping[str, Any]], key: str | tuple[str, ...], limit: int | None
+) -> str | None:
+    if limit is None or len(page) < limit or not page:
+        return None
+    keys = (key,) if isinstance(key, str) else key
+    return encode_cursor(*(page[-1][name] for name in keys))
@@ -1,13 +1,23 @@
+import re
 from datetime import datetime
+from typing import Any, AsyncIterator
 
-from sqlalchemy import select
+from sqlalchemy import func, insert, literal_column, select, update
 
 from src.exceptions import NotFoundError
-from src.models import Product
-from src.schemas import PostProduct, PutProduct
-from src.services import create_session
+from src.models import Product, products_fts, serialize_product
+from src.schemas import PostProduct, PutProduct, BulkPutProduct
+from src.services import create_read_session, create_session
+from src.services.admission import admit_write
+from src.services.cache import product_cache
+from src.services.pagination import decode_cursor, next_cursor
 
+EXPORT_CHUNK_SIZE = 1000
+# bm25 column weights for (name, description)
+SEARCH_WEIGHTS = (10.0, 1.0)
 
+
+@admit_write
 async def post_product(args: PostProduct) -> Product:
     async with create_session() as session:
         product = Product(
@@ -15,8 +25,8 @@ async def post_product(args: PostProduct) -> Product:
             description=args.description,
             price=args.price,
             quantity=args.quantity,
-            created_at=datetime.now().isoformat(),
-            updated_at=datetime.now().isoformat(),
+            created_at=datetime.now(),
+            updated_at=datetime.now(),
         )
         session.add(product)
         await session.flush()
@@ -24,25 +34,150 @@ async def post_product(args: PostProduct) -> Product:
         return product
 
 
-async def get_products(
-    limit: int | None = None, offset: int | None = 0
-) -> list[Product]:
+@admit_write
+async def post_products(args: list[PostProduct]) -> list[int]:
+    if not args:
+        return []
     async with create_session() as session:
-        query = select(Product)
-        results: list[Product] = (await session.scalars(query)).all()
-        if limit is not None:
-            results = results[offset : offset + limit]
-        return results
+        now = datetime.now()
+        result = await session.execute(
+            insert(Product).returning(
+                Product.product_id, sort_by_parameter_order=True
+            ),
+            [
+                {**item.model_dump(), "created_at": now, "updated_at": now}
+                for item in args
+            ],
+        )
+        product_ids = list(result.scalars())
+        await session.commit()
+        return product_ids
 
 
-async def get_product(id: int) -> Product:
+@admit_write
+async def put_products(args: list[BulkPutProduct]) -> list[int]:
+    if not args:
+        return []
     async with create_session() as session:
+        product_ids = [item.product_id for item in args]
+        query = select(Product.product_id).where(Product.product_id.in_(product_ids))
+        existing_ids = set((await session.scalars(query)).all())
+        missing_ids = [id for id in product_ids if id not in existing_ids]
+        if missing_ids:
+            raise NotFoundError(f"Can't find products with ids {missing_ids}")
+
+        now = datetime.now()
+        await session.execute(
+            update(Product),
+            [
+                {**item.model_dump(exclude_none=True), "updated_at": now}
+                for item in args
+            ],
+        )
+        await session.commit()
+        for product_id in product_ids:
+            product_cache.pop(product_id)
+        return product_ids
+
+
+async def get_products(
+    limit: int | None = None, offset: int = 0, after: str | None = None
+) -> tuple[list[dict[str, Any]], str | None]:
+    async with create_read_session() as session:
+        query = select(*Product.__table__.columns).order_by(Product.product_id)
+        if after is not None:
+            query = query.where(Product.product_id > decode_cursor(after))
+        if limit is not None:
+            query = query.limit(limit)
+        if offset:
+            query = query.offset(offset)
+        rows = (await session.execute(query)).all()
+
+        products_list = [serialize_product(row) for row in rows]
+        return products_list, next_cursor(products_list, "product_id", limit)
+
+
+def _match_expression(q: str) -> str | None:
+    # Quote every word so user input can't inject FTS5 query syntax, and match
+    # the last one as a prefix for search-as-you-type
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+async def search_products(
+    q: str, limit: int = 20, offset: int = 0
+) -> list[dict[str, Any]]:
+    match = _match_expression(q)
+    if match is None:
+        return []
+    async with create_read_session() as session:
+        rank = func.bm25(literal_column("products_fts"), *SEARCH_WEIGHTS)
+        query = (
+            select(*Product.__table__.columns)
+            .join(products_fts, products_fts.c.rowid == Product.product_id)
+            .where(products_fts.c.products_fts.match(match))
+            .order_by(rank, Product.product_id)
+            .limit(limit)
+            .offset(offset)
+        )
+        rows = (await session.execute(query)).all()
+        return [serialize_product(row) for row in rows]
+
+
+async def export_products() -> AsyncIterator[dict[str, Any]]:
+    async with create_read_session() as session:
+        query = (
+            select(*Product.__table__.columns)
+            .order_by(Product.product_id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        async for row in await session.stream(query):
+            yield serialize_product(row)
+
+
+async def get_product_stats(
+    low_stock_threshold: int = 5, low_stock_limit: int = 100
+) -> dict[str, Any]:
+    async with create_read_session() as session:
+        totals_query = select(
+            func.count(Product.product_id).label("products"),
+            func.coalesce(func.sum(Product.quantity), 0).label("total_stock"),
+            func.coalesce(func.sum(Product.price * Product.quantity), 0.0).label(
+                "stock_value"
+            ),
+        )
+        totals = (await session.execute(totals_query)).mappings().one()
+
+        low_stock_query = (
+            select(Product.product_id, Product.name, Product.quantity)
+            .where(Product.quantity <= low_stock_threshold)
+            .order_by(Product.quantity, Product.product_id)
+            .limit(low_stock_limit)
+        )
+        low_stock = (await session.execute(low_stock_query)).mappings().all()
+        return {**totals, "low_stock": [dict(row) for row in low_stock]}
+
+
+async def get_product(id: int) -> dict[str, Any]:
+    product_dict = product_cache.get(id)
+    if product_dict is not None:
+        return product_dict
+
+    generation = product_cache.generation
+    async with create_read_session() as session:
         product = await session.get(Product, id)
         if product is None:
             raise NotFoundError("Can't find product with this id")
-        return product
+        product_dict = product.as_dict()
+    product_cache.set(id, product_dict, generation)
+    return product_dict
 
 
+@admit_write
 async def put_product(id: int, args: PutProduct) -> Product:
     async with create_session() as session:
         product = await session.get(Product, id)
@@ -57,12 +192,14 @@ async def put_product(id: int, args: PutProduct) -> Product:
             product.price = args.price
         if args.quantity is not None:
             product.quantity = args.quantity
-        product.updated_at = datetime.now().isoformat()
+        product.updated_at = datetime.now()
 
         await session.commit()
+        product_cache.set(id, product.as_dict())
         return product
 
 
+@admit_write
 async def delete_product(id: int):
     async with create_session() as session:
         product = await session.get(Product, id)
@@ -71,3 +208,4 @@ async def delete_product(id: int):
 
         await session.delete(product)
         await session.commit()
+        product_cache.pop(id)
@@ -0,0 +1,130 @@
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Select,
+    delete,
+    distinct,
+    func,
+    insert,
+    literal,
+    select,
+    type_coerce,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models import (
+    HourlyOrderStats,
+    Order,
+    OrderItem,
+    ProductSalesStats,
+    serialize_hourly_order_stats,
+    serialize_product_sales_stats,
+)
+from src.services import create_read_session, create_session
+
+HOUR_US = 3_600_000_000
+ROLLUP_COLUMNS = ["status", "orders", "units", "revenue"]
+
+
+def _totals(sign: int) -> list[ColumnElement]:
+    return [
+        func.count(distinct(Order.order_id)) * sign,
+        func.coalesce(func.sum(OrderItem.quantity), 0) * sign,
+        func.coalesce(func.sum(OrderItem.line_total), 0.0) * sign,
+    ]
+
+
+def _hourly_rows(status: ColumnElement, sign: int = 1) -> Select:
+    bucket = type_coerce(Order.created_at, BigInteger) // HOUR_US * HOUR_US
+    return (
+        select(bucket, status, *_totals(sign))
+        .select_from(Order)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.order_id)
+        .group_by(bucket, status)
+    )
+
+
+def _product_rows(status: ColumnElement, sign: int = 1) -> Select:
+    return (
+        select(OrderItem.product_id, status, *_totals(sign))
+        .select_from(Order)
+        .join(OrderItem, OrderItem.order_id == Order.order_id)
+        .group_by(OrderItem.product_id, status)
+    )
+
+
+def _upsert(model, keys: list[str], rows: Select):
+    query = sqlite_insert(model).from_select(keys + ROLLUP_COLUMNS, rows)
+    return query.on_conflict_do_update(
+        index_elements=keys + ["status"],
+        set_={
+            name: getattr(model, name) + getattr(query.excluded, name)
+            for name in ROLLUP_COLUMNS[1:]
+        },
+    )
+
+
+async def apply_order_rollups(
+    session: AsyncSession, order_id: int, status: str, sign: int = 1
+) -> None:
+    # Books the order under `status`; sign=-1 takes it back out
+    status_column = literal(status)
+    hourly_rows = _hourly_rows(status_column, sign).where(Order.order_id == order_id)
+    await session.execute(_upsert(HourlyOrderStats, ["bucket"], hourly_rows))
+    product_rows = _product_rows(status_column, sign).where(Order.order_id == order_id)
+    await session.execute(_upsert(ProductSalesStats, ["product_id"], product_rows))
+
+
+async def rebuild_rollups() -> None:
+    async with create_session() as session:
+        await session.execute(delete(HourlyOrderStats))
+        await session.execute(
+            insert(HourlyOrderStats).from_select(
+                ["bucket"] + ROLLUP_COLUMNS, _hourly_rows(Order.status)
+            )
+        )
+        await session.execute(delete(ProductSalesStats))
+        await session.execute(
+            insert(ProductSalesStats).from_select(
+                ["product_id"] + ROLLUP_COLUMNS, _product_rows(Order.status)
+            )
+        )
+        await session.commit()
+
+
+async def get_hourly_stats(
+    bucket_from: datetime | None = None,
+    bucket_to: datetime | None = None,
+    status: str | None = None,
+) -> list[dict[str, Any]]:
+    async with create_read_session() as session:
+        query = (
+            select(*HourlyOrderStats.__table__.columns)
+            .where(HourlyOrderStats.orders > 0)
+            .order_by(HourlyOrderStats.bucket, HourlyOrderStats.status)
+        )
+        if bucket_from is not None:
+            query = query.where(HourlyOrderStats.bucket >= bucket_from)
+        if bucket_to is not None:
+            query = query.where(HourlyOrderStats.bucket < bucket_to)
+        if status is not None:
+            query = query.where(HourlyOrderStats.status == status)
+        rows = await session.execute(query)
+        return [serialize_hourly_order_stats(row) for row in rows]
+
+
+async def get_product_sales_stats(status: str | None = None) -> list[dict[str, Any]]:
+    async with create_read_session() as session:
+        query = (
+            select(*ProductSalesStats.__table__.columns)
+            .where(ProductSalesStats.orders > 0)
+            .order_by(ProductSalesStats.product_id, ProductSalesStats.status)
+        )
+        if status is not None:
+            query = query.where(ProductSalesStats.status == status)
+        rows = await session.execute(query)
+        return [serialize_product_sales_stats(row) for row in rows]
@@ -0,0 +1,122 @@
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import Scope
+
+EXPLAINED_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+MAX_PARAMETERS_LENGTH = 500
+
+logger = logging.getLogger("app")
+# Set per request by the request scope middleware, the router fills in the
+# matched route before any query runs
+request_scope: ContextVar[Scope | None] = ContextVar("request_scope", default=None)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float = 100.0, max_records: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.records: deque[dict[str, Any]] = deque(maxlen=max_records)
+
+    def record(
+        self,
+        conn,
+        engine_name: str,
+        statement: str,
+        parameters: Any,
+        executemany: bool,
+        duration: float,
+    ) -> None:
+        record = {
+            "time": datetime.now().isoformat(),
+            "engine": engine_name,
+            "route": _current_route(),
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement,
+            "parameters": _format_parameters(parameters, executemany),
+            "plan": _explain(conn, statement, parameters, executemany),
+        }
+        self.records.append(record)
+        logger.warning(
+            "Slow query %.1f ms on %s from %s: %s; parameters: %s; plan: %s",
+            record["duration_ms"],
+            engine_name,
+            record["route"],
+            statement,
+            record["parameters"],
+            record["plan"],
+        )
+
+
+__slow_query_log: SlowQueryLog | None = None
+
+
+def configure_slow_query_log(
+    enabled: bool, threshold_ms: float = 100.0, max_records: int = 100
+) -> None:
+    global __slow_query_log
+    __slow_query_log = SlowQueryLog(threshold_ms, max_records) if enabled else None
+
+
+def get_slow_queries() -> list[dict[str, Any]]:
+    if __slow_query_log is None:
+        return []
+    return list(reversed(__slow_query_log.records))
+
+
+def _current_route() -> str | None:
+    scope = request_scope.get()
+    if scope is None:
+        return None
+    route = scope.get("route")
+    return f"{scope['method']} {route.path if route is not None else scope['path']}"
+
+
+def _format_parameters(parameters: Any, executemany: bool) -> str:
+    if executemany:
+        text = f"{len(parameters)} parameter sets, first: {parameters[0]!r}"
+    else:
+        text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        text = text[:MAX_PARAMETERS_LENGTH] + "..."
+    return text
+
+
+def _explain(conn, statement: str, parameters: Any, executemany: bool) -> list[str]:
+    words = statement.lstrip().split(None, 1)
+    if not words or words[0].upper() not in EXPLAINED_STATEMENTS:
+        return []
+    if executemany:
+        parameters = parameters[0]
+    # Run on the raw connection so the EXPLAIN isn't reported itself
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return [row[3] for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN QUERY PLAN failed: {e}"]
+    finally:
+        cursor.close()
+
+
+def watch_engine(engine: AsyncEngine, engine_name: str) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if __slow_query_log is not None:
+            conn.info["slow_query_start"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def check_duration(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("slow_query_start", None)
+        if __slow_query_log is None or start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration >= __slow_query_log.threshold:
+            __slow_query_log.record(
+                conn, engine_name, statement, parameters, executemany, duration
+            )
@@ -0,0 +1,50 @@
+import logging.config
+
+import pytest
+import yaml
+from httpx import AsyncClient
+
+from main import app
+from src.services import base_init
+from src.services.slow_queries import configure_slow_query_log
+
+with open("config.yaml", encoding="utf-8") as stream:
+    try:
+        cfg = yaml.safe_load(stream)
+    except yaml.YAMLError as exc:
+        print("Can't read config file")
+        raise exc
+logging.config.dictConfig(cfg["logger"])
+logger = logging.getLogger("testing")
+
+base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+
+# The pooled connections' asyncio queues bind to the first loop that waits on them
+pytestmark = pytest.mark.asyncio(scope="session")
+
+URL = "/debug/slow-queries"
+
+
+async def test_get_slow_queries() -> None:
+    configure_slow_query_log(True, threshold_ms=0, max_records=5)
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            response = await ac.get("/orders/", params={"status": "Slow"})
+            assert response.status_code == 200
+            response = await ac.get(URL)
+    finally:
+        configure_slow_query_log(**cfg["slow_query_log"])
+    assert response.status_code == 200
+    records = response.json()
+    assert 0 < len(records) <= 5
+    record = next(record for record in records if "FROM orders" in record["statement"])
+    assert record["route"] == "GET /orders/"
+    assert record["engine"] == "reader"
+    assert "Slow" in record["parameters"]
+    assert any("orders" in line for line in record["plan"])
+
+    # Nothing is recorded once disabled
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(URL)
+    assert response.json() == []
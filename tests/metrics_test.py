@@ -0,0 +1,63 @@
+import logging.config
+
+import pytest
+import yaml
+from httpx import AsyncClient
+
+from main import app
+from src.services import base_init
+
+with open("config.yaml", encoding="utf-8") as stream:
+    try:
+        cfg = yaml.safe_load(stream)
+    except yaml.YAMLError as exc:
+        print("Can't read config file")
+        raise exc
+logging.config.dictConfig(cfg["logger"])
+logger = logging.getLogger("testing")
+
+base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+
+# The pooled connections' asyncio queues bind to the first loop that waits on them
+pytestmark = pytest.mark.asyncio(scope="session")
+
+URL = "/metrics"
+
+
+def _parse_metrics(text: str) -> dict[str, float]:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+async def test_get_metrics() -> None:
+    # Make some requests to record
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get("/products/100000")
+        assert response.status_code == 404
+        response = await ac.get("/products/")
+        assert response.status_code == 200
+        response = await ac.get("/missing")
+        assert response.status_code == 404
+
+        response = await ac.get(URL)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = _parse_metrics(response.text)
+
+    # Requests are labelled with their route template
+    route_labels = 'method="GET",route="/products/{id}",status="404"'
+    assert samples[f"http_request_duration_seconds_count{{{route_labels}}}"] >= 1
+    assert samples[f'http_request_duration_seconds_bucket{{{route_labels},le="+Inf"}}'] >= 1
+    assert 'route="/products/100000"' not in response.text
+    assert samples['http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}'] >= 1
+    # The metrics request itself is still being served
+    assert samples['http_requests_in_flight{method="GET"}'] == 1
+
+    # Queries and pool checkouts are recorded per engine
+    assert samples['db_queries_total{engine="reader",statement="SELECT"}'] >= 2
+    assert samples['db_query_duration_seconds_count{engine="reader",statement="SELECT"}'] >= 2
+    assert samples['db_pool_checkout_wait_seconds_count{engine="reader"}'] >= 1
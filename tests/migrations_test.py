@@ -0,0 +1,155 @@
+import sqlite3
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+
+from src.models import Order, OrderItem, Product, serialize_order, serialize_product
+from src.services.migrations import SCHEMA_VERSION, migrate
+
+DB_PATH = Path("db/migration_test.sqlite")
+
+# Schema as created by the first release, timestamps are ISO strings
+BASELINE_SCHEMA = """
+CREATE TABLE orders (
+    order_id INTEGER NOT NULL,
+    status VARCHAR NOT NULL,
+    created_at VARCHAR NOT NULL,
+    updated_at VARCHAR NOT NULL,
+    PRIMARY KEY (order_id)
+);
+CREATE TABLE products (
+    product_id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    description VARCHAR NOT NULL,
+    price FLOAT NOT NULL,
+    quantity INTEGER NOT NULL,
+    created_at VARCHAR NOT NULL,
+    updated_at VARCHAR NOT NULL,
+    PRIMARY KEY (product_id)
+);
+CREATE TABLE order_items (
+    order_item_id INTEGER NOT NULL,
+    order_id INTEGER NOT NULL,
+    product_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (order_item_id),
+    FOREIGN KEY(order_id) REFERENCES orders (order_id),
+    FOREIGN KEY(product_id) REFERENCES products (product_id)
+);
+"""
+BASELINE_PRODUCTS = [
+    (1, "Walnut desk", "Solid wood", 150.0, 3, "2024-01-01T10:00:00.123456", "2024-03-05T08:30:00"),
+    (2, "Desk lamp", "Warm light", 20.5, 7, "2024-06-30T23:59:59.999999", "2024-06-30T23:59:59.999999"),
+]
+BASELINE_ORDERS = [
+    (1, "Paid", "2024-01-02T10:00:00", "2024-01-02T10:00:00.500000"),
+    (2, "Created", "2024-07-01T00:00:00.000001", "2024-07-01T12:00:00"),
+    (3, "Empty", "2024-07-02T09:15:00", "2024-07-02T09:15:00"),
+]
+BASELINE_ORDER_ITEMS = [(1, 1, 1, 2), (2, 1, 2, 1), (3, 2, 2, 4)]
+
+
+@pytest.fixture
+def baseline_db() -> Path:
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    DB_PATH.unlink(missing_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    conn.executescript(BASELINE_SCHEMA)
+    conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", BASELINE_PRODUCTS)
+    conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?)", BASELINE_ORDERS)
+    conn.executemany("INSERT INTO order_items VALUES (?, ?, ?, ?)", BASELINE_ORDER_ITEMS)
+    conn.commit()
+    conn.close()
+    yield DB_PATH
+    DB_PATH.unlink(missing_ok=True)
+
+
+def test_migrate_baseline_database(baseline_db: Path) -> None:
+    engine = create_engine(f"sqlite:///{baseline_db}")
+    with engine.begin() as conn:
+        migrate(conn)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+
+        # Timestamps come back as the ISO strings they were stored as
+        products = [serialize_product(row) for row in conn.execute(select(*Product.__table__.columns).order_by(Product.product_id))]
+        assert [(product["created_at"], product["updated_at"]) for product in products] == [(row[5], row[6]) for row in BASELINE_PRODUCTS]
+        orders = conn.execute(select(*Order.__table__.columns).order_by(Order.order_id)).all()
+        assert [(serialize_order(row)["created_at"], serialize_order(row)["updated_at"]) for row in orders] == [(row[2], row[3]) for row in BASELINE_ORDERS]
+
+        # Summaries and totals are backfilled from the items
+        assert [order.items_summary for order in orders] == [
+            [[1, "Walnut desk", 2, 300.0], [2, "Desk lamp", 1, 20.5]],
+            [[2, "Desk lamp", 4, 82.0]],
+            [],
+        ]
+        assert [order.total for order in orders] == [320.5, 82.0, 0.0]
+        items = conn.execute(select(OrderItem.unit_price, OrderItem.line_total).order_by(OrderItem.order_item_id)).all()
+        assert [tuple(item) for item in items] == [(150.0, 300.0), (20.5, 20.5), (20.5, 82.0)]
+
+        # Indexes are in place
+        indexes = {index["name"] for table in ("orders", "order_items", "idempotency_keys") for index in inspect(conn).get_indexes(table)}
+        assert {
+            "ix_orders_status_created_at",
+            "ix_orders_status_updated_at",
+            "ix_orders_created_at",
+            "ix_orders_updated_at",
+            "ix_order_items_order_id",
+            "ix_order_items_product_id",
+            "ix_idempotency_keys_expires_at",
+        } <= indexes
+
+        # Rollups are backfilled
+        revenue = conn.execute(text("SELECT sum(revenue) FROM order_hourly_stats")).scalar()
+        assert revenue == 402.5
+
+        # Existing products are searchable and triggers keep the index in sync
+        assert conn.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH 'desk'")).scalars().all() == [1, 2]
+        conn.execute(text("UPDATE products SET name = 'Oak table' WHERE product_id = 1"))
+        assert conn.execute(text("SELECT rowid FROM products_fts WHERE products_fts MATCH 'desk'")).scalars().all() == [2]
+        conn.rollback()
+
+    # Migrating again is a no-op
+    with engine.begin() as conn:
+        migrate(conn)
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+    engine.dispose()
+
+
+def _schema(engine) -> dict[str, Any]:
+    inspector = inspect(engine)
+    with engine.connect() as conn:
+        triggers = conn.execute(text("SELECT tbl_name, name FROM sqlite_master WHERE type = 'trigger'")).all()
+    return {
+        "triggers": sorted(tuple(trigger) for trigger in triggers),
+        **{
+            table: (
+                {column["name"]: (str(column["type"]), column["nullable"]) for column in inspector.get_columns(table)},
+                inspector.get_pk_constraint(table)["constrained_columns"],
+                {index["name"]: index["column_names"] for index in inspector.get_indexes(table)},
+            )
+            for table in inspector.get_table_names()
+        },
+    }
+
+
+def test_migrated_schema_matches_models(baseline_db: Path) -> None:
+    migrated = create_engine(f"sqlite:///{baseline_db}")
+    with migrated.begin() as conn:
+        migrate(conn)
+
+    fresh_path = DB_PATH.with_name("migration_test_fresh.sqlite")
+    fresh_path.unlink(missing_ok=True)
+    fresh = create_engine(f"sqlite:///{fresh_path}")
+    with fresh.begin() as conn:
+        migrate(conn)
+
+    try:
+        assert _schema(migrated) == _schema(fresh)
+    finally:
+        migrated.dispose()
+        fresh.dispose()
+        fresh_path.unlink(missing_ok=True)
@@ -1,3 +1,5 @@
+import asyncio
+import json
 import logging.config
 from typing import Any
 
@@ -6,7 +8,12 @@ import yaml
 from httpx import AsyncClient, Response
 
 from main import app
-from src.services import base_init, clear_all_rows
+from src.services import base_init, clear_all_rows, order_service
+from src.services.admission import configure_write_admission
+from src.services.order_service import configure_write_batching
+from src.services.pagination import encode_cursor
+from src.services.rollup_service import rebuild_rollups
+from src.services.slow_queries import configure_slow_query_log, get_slow_queries
 
 with open("config.yaml", encoding="utf-8") as stream:
     try:
@@ -17,7 +24,10 @@ with open("config.yaml", encoding="utf-8") as stream:
 logging.config.dictConfig(cfg["logger"])
 logger = logging.getLogger("testing")
 
-base_init(cfg["db_path"])
+base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+
+# The pooled connections' asyncio queues bind to the first loop that waits on them
+pytestmark = pytest.mark.asyncio(scope="session")
 
 URL = "/orders"
 PRODUCTS_URL = "/products"
@@ -326,3 +336,594 @@ async def test_patch_order_status(post_products: list[dict[str, Any]], post_orde
 
     # Delete items
     await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders, limit",
+    [
+        (DEFAULT_PRODUCTS, [DEFAULT_ORDER_2, DEFAULT_ORDER_2, DEFAULT_ORDER_2], 1),
+        (DEFAULT_PRODUCTS, [DEFAULT_ORDER_2, DEFAULT_ORDER_2, DEFAULT_ORDER_2], 2),
+    ],
+)
+async def test_get_orders_cursor(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]], limit: int) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    order_ids = await _post_orders(post_orders_to_export)
+
+    # Walk pages
+    seen_ids: list[int] = list()
+    params: dict[str, Any] = {"limit": limit}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        while True:
+            response = await ac.get(URL, params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= limit
+            seen_ids.extend(order["order_id"] for order in page)
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params = {"limit": limit, "after": response.headers["X-Next-Cursor"]}
+    assert seen_ids == order_ids
+
+    # Invalid cursors, including ids out of SQLite's integer range
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for cursor in ("not a cursor", encode_cursor(10**20), encode_cursor(-(10**20))):
+            response = await ac.get(URL, params={"limit": limit, "after": cursor})
+            assert response.status_code == 400
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS),
+    ],
+)
+async def test_export_orders(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]]) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Convert order to result type
+    result_orders = [_convert_order_to_result_type(order, post_products) for order in post_orders]
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    await _post_orders(post_orders_to_export)
+
+    # Export orders
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    response_orders = [json.loads(line) for line in response.text.splitlines()]
+    assert len(response_orders) == len(result_orders)
+    for response_order, result_order in zip(response_orders, result_orders):
+        assert response_order["status"] == result_order["status"]
+        assert response_order["order_items"] == result_order["order_items"]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_product, orders_count",
+    [
+        ({"name": "Hot product", "price": 1.0, "quantity": 5}, 10),
+    ],
+)
+async def test_post_order_concurrent(post_product: dict[str, Any], orders_count: int) -> None:
+    await clear_all_rows()
+
+    # Create item
+    product_id = await _post_product(post_product)
+
+    # Create orders concurrently
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        responses = await asyncio.gather(
+            *(ac.post(URL, json={"items": {product_id: 1}}) for _ in range(orders_count))
+        )
+    status_codes = [response.status_code for response in responses]
+    assert status_codes.count(201) == post_product["quantity"]
+    assert status_codes.count(400) == orders_count - post_product["quantity"]
+
+    # Check quantity changes
+    response = await _get_product(product_id)
+    assert response.json()["quantity"] == 0
+
+    # Delete item
+    await _delete_product(product_id)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders, status_codes",
+    [
+        (DEFAULT_PRODUCTS, [DEFAULT_ORDER_1, DEFAULT_ORDER_2], [201, 201]),
+        (DEFAULT_PRODUCTS, [DEFAULT_ORDER_1, DEFAULT_ORDER_1, DEFAULT_ORDER_2], [201, 400, 201]),
+        (DEFAULT_PRODUCTS, [{"status": "Some status", "items": {0: 1, 10: 1}}, DEFAULT_ORDER_2], [404, 201]),
+    ],
+)
+async def test_post_orders_bulk(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]], status_codes: list[int]) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(f"{URL}/bulk", json=post_orders_to_export)
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status_code"] for result in results] == status_codes
+
+    # Check created orders and quantity changes
+    sold = [0] * len(product_ids)
+    for result, post_order in zip(results, post_orders):
+        if result["status_code"] != 201:
+            continue
+        response_order = (await _get_order(result["id"])).json()
+        assert response_order["status"] == post_order["status"]
+        for key, value in post_order["items"].items():
+            sold[key] += value
+    for i, product_id in enumerate(product_ids):
+        response_product = (await _get_product(product_id)).json()
+        assert response_product["quantity"] + sold[i] == post_products[i]["quantity"]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_order",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_1),
+    ],
+)
+async def test_post_order_refreshes_product(post_products: list[dict[str, Any]], post_order: dict[str, Any]) -> None:
+    await clear_all_rows()
+
+    # Create items and read them once
+    product_ids = await _post_products(post_products)
+    for product_id in product_ids:
+        await _get_product(product_id)
+
+    # Create order
+    await _post_order({"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)})
+
+    # Check quantity changes
+    for i, product_id in enumerate(product_ids):
+        response_product = (await _get_product(product_id)).json()
+        assert response_product["quantity"] + post_order["items"][i] == post_products[i]["quantity"]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_order, new_name, new_status",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_1, "Renamed product", "Some new status"),
+    ],
+)
+async def test_get_order_after_changes(post_products: list[dict[str, Any]], post_order: dict[str, Any], new_name: str, new_status: str) -> None:
+    await clear_all_rows()
+
+    # Create items and order, then read the order once
+    product_ids = await _post_products(post_products)
+    order_id = await _post_order({"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)})
+    await _get_order(order_id)
+
+    # Orders keep the product names they were created with
+    original_items = _convert_order_to_result_type(post_order, post_products)["order_items"]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.put(f"{PRODUCTS_URL}/{product_ids[0]}", json={"name": new_name})
+    assert response.status_code == 200
+    response_order = (await _get_order(order_id)).json()
+    assert response_order["order_items"] == original_items
+
+    # Change status
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.patch(f"{URL}/{order_id}/status", params={"order_status": new_status})
+    assert response.status_code == 200
+    response_order = (await _get_order(order_id)).json()
+    assert response_order["status"] == new_status
+
+    # Rename product in bulk, resending an unchanged name too
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.put(f"{PRODUCTS_URL}/bulk", json=[{"product_id": product_ids[1], "name": new_name + " 2"}, {"product_id": product_ids[0], "name": new_name}])
+        assert response.status_code == 200
+        response = await ac.get(URL)
+    assert response.json()[0]["order_items"] == original_items
+
+    # Deleted products stay in the order too
+    total = response_order["total"]
+    await _delete_product(product_ids[0])
+    response_order = (await _get_order(order_id)).json()
+    assert response_order["order_items"] == original_items
+    assert response_order["total"] == total
+
+    # Delete items
+    await _delete_products(product_ids[1:])
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders, result_orders, params",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, [DEFAULT_ORDER_1], {"status": "First order"}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, [DEFAULT_ORDER_2], {"status": "Second order", "limit": 1}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, [], {"status": "Unknown status"}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, DEFAULT_ORDERS, {"created_from": "2000-01-01T00:00:00"}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, [], {"created_to": "2000-01-01T00:00:00"}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, [], {"updated_since": "2999-01-01T00:00:00"}),
+    ],
+)
+async def test_get_orders_filter(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]], result_orders: list[dict[str, Any]], params: dict[str, Any]) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    await _post_orders(post_orders_to_export)
+
+    # Get filtered orders
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(URL, params=params)
+    assert response.status_code == 200
+    response_orders: list[dict[str, Any]] = response.json()
+    assert [order["status"] for order in response_orders] == [order["status"] for order in result_orders]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_order, params, by_updated_at",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, {"status": "Paid"}, False),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, {"status": "Paid", "created_from": "2000-01-01T00:00:00", "created_to": "2999-01-01T00:00:00"}, False),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, {"created_from": "2000-01-01T00:00:00"}, False),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, {"updated_since": "2000-01-01T00:00:00"}, True),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, {"status": "Paid", "updated_since": "2000-01-01T00:00:00"}, True),
+    ],
+)
+async def test_get_orders_filter_cursor(post_products: list[dict[str, Any]], post_order: dict[str, Any], params: dict[str, Any], by_updated_at: bool) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders, then touch the first one so it's the last updated
+    items = _convert_order_items_ids(post_order["items"], product_ids)
+    order_ids = await _post_orders([{"status": "Paid", "items": items} for _ in range(5)])
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.patch(f"{URL}/{order_ids[0]}/status", params={"order_status": "Paid"})
+    assert response.status_code == 200
+    expected_ids = order_ids[1:] + order_ids[:1] if by_updated_at else order_ids
+
+    # Walk pages, recording the query plans
+    configure_slow_query_log(True, threshold_ms=0)
+    seen_ids: list[int] = list()
+    page_params: dict[str, Any] = {**params, "limit": 2}
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            while True:
+                response = await ac.get(URL, params=page_params)
+                assert response.status_code == 200
+                seen_ids.extend(order["order_id"] for order in response.json())
+                if "X-Next-Cursor" not in response.headers:
+                    break
+                page_params = {**params, "limit": 2, "after": response.headers["X-Next-Cursor"]}
+
+            # An order id cursor doesn't fit a filtered listing
+            response = await ac.get(URL, params={**params, "limit": 2, "after": encode_cursor(order_ids[0])})
+            assert response.status_code == 400
+        records = get_slow_queries()
+    finally:
+        configure_slow_query_log(**cfg["slow_query_log"])
+    assert seen_ids == expected_ids
+
+    # Pages are read in order off an index, without scanning or sorting orders
+    plans = [record["plan"] for record in records if record["statement"].lstrip().startswith("SELECT") and "FROM orders" in record["statement"]]
+    assert plans
+    for plan in plans:
+        assert all("USING INDEX" in line for line in plan), plan
+        assert not any("TEMP B-TREE" in line for line in plan), plan
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders, params",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, {}),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, {"status": "First order"}),
+    ],
+)
+async def test_get_order_stats(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]], params: dict[str, Any]) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    await _post_orders(post_orders_to_export)
+
+    # Expected numbers
+    counted_orders = [order for order in post_orders if params.get("status", order["status"]) == order["status"]]
+    units_by_product = [0] * len(product_ids)
+    orders_by_product = [0] * len(product_ids)
+    for order in counted_orders:
+        for key, value in order["items"].items():
+            units_by_product[key] += value
+            orders_by_product[key] += 1
+
+    # Get stats
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/stats", params=params)
+    assert response.status_code == 200
+    stats = response.json()
+    assert {row["status"]: row["orders"] for row in stats["by_status"]} == {order["status"]: 1 for order in counted_orders}
+    assert sum(row["orders"] for row in stats["by_day"]) == len(counted_orders)
+    assert sum(row["units"] for row in stats["by_day"]) == sum(units_by_product)
+    response_products = {row["product_id"]: row for row in stats["by_product"]}
+    for i, product_id in enumerate(product_ids):
+        if units_by_product[i] == 0:
+            assert product_id not in response_products
+            continue
+        assert response_products[product_id]["name"] == post_products[i]["name"]
+        assert response_products[product_id]["units"] == units_by_product[i]
+        assert response_products[product_id]["orders"] == orders_by_product[i]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+async def _get_rollups() -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        hourly = await ac.get(f"{URL}/stats/hourly")
+        products = await ac.get(f"{URL}/stats/products")
+    assert hourly.status_code == 200
+    assert products.status_code == 200
+    return hourly.json(), products.json()
+
+
+@pytest.mark.parametrize(
+    "post_products, post_orders, new_status",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDERS, "Paid"),
+    ],
+)
+async def test_order_rollups(post_products: list[dict[str, Any]], post_orders: list[dict[str, Any]], new_status: str) -> None:
+    await clear_all_rows()
+
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Create orders
+    post_orders_to_export = [
+        {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+        for post_order in post_orders
+    ]
+    order_ids = await _post_orders(post_orders_to_export)
+
+    # Check rollups
+    hourly, products = await _get_rollups()
+    assert sum(row["orders"] for row in hourly) == len(post_orders)
+    assert {row["status"] for row in hourly} == {order["status"] for order in post_orders}
+    revenue = sum(post_products[key]["price"] * value for order in post_orders for key, value in order["items"].items())
+    assert sum(row["revenue"] for row in hourly) == pytest.approx(revenue)
+    units = {product_id: 0 for product_id in product_ids}
+    for order in post_orders:
+        for key, value in order["items"].items():
+            units[product_ids[key]] += value
+    response_units = {product_id: 0 for product_id in product_ids}
+    for row in products:
+        response_units[row["product_id"]] += row["units"]
+    assert response_units == units
+
+    # Change status of the first order after a price change
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.put(f"{PRODUCTS_URL}/{product_ids[0]}", json={"price": 1000.0})
+        assert response.status_code == 200
+        response = await ac.patch(f"{URL}/{order_ids[0]}/status", params={"order_status": new_status})
+    assert response.status_code == 200
+    hourly, products = await _get_rollups()
+    assert sum(row["revenue"] for row in hourly) == pytest.approx(revenue)
+    assert {row["status"] for row in hourly} == {new_status} | {order["status"] for order in post_orders[1:]}
+    assert sum(row["orders"] for row in hourly) == len(post_orders)
+    assert sum(row["units"] for row in products if row["status"] == new_status) == sum(post_orders[0]["items"].values())
+
+    # Rebuild gives the same rollups
+    await rebuild_rollups()
+    assert await _get_rollups() == (hourly, products)
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_product, orders_count",
+    [
+        ({"name": "Hot product", "price": 1.0, "quantity": 5}, 10),
+    ],
+)
+async def test_post_order_write_batching(post_product: dict[str, Any], orders_count: int) -> None:
+    await clear_all_rows()
+    configure_write_batching(True, max_batch_size=4)
+
+    try:
+        # Create item
+        product_id = await _post_product(post_product)
+
+        # Create orders concurrently
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            responses = await asyncio.gather(
+                *(ac.post(URL, json={"items": {product_id: 1}}) for _ in range(orders_count)),
+                ac.post(URL, json={"items": {product_id + 1: 1}}),
+            )
+        status_codes = [response.status_code for response in responses]
+        assert status_codes.count(201) == post_product["quantity"]
+        assert status_codes.count(400) == orders_count - post_product["quantity"]
+        assert status_codes[-1] == 404
+
+        # Check created orders and quantity changes
+        for response in responses:
+            if response.status_code == 201:
+                await _get_order(response.json()["id"])
+        response = await _get_product(product_id)
+        assert response.json()["quantity"] == 0
+    finally:
+        configure_write_batching(False)
+
+    # Delete item
+    await _delete_product(product_id)
+
+
+@pytest.mark.parametrize(
+    "post_product, orders_count, max_waiting",
+    [
+        ({"name": "Hot product", "price": 1.0, "quantity": 100}, 40, 100),
+        ({"name": "Hot product", "price": 1.0, "quantity": 100}, 40, 5),
+    ],
+)
+async def test_post_order_write_batching_admission(post_product: dict[str, Any], orders_count: int, max_waiting: int, monkeypatch: pytest.MonkeyPatch) -> None:
+    await clear_all_rows()
+    configure_write_batching(True, max_batch_size=100)
+    configure_write_admission(max_concurrency=1, max_waiting=max_waiting, retry_after=3)
+
+    # Record the size of each batch the writer task applies
+    batch_sizes: list[int] = list()
+    post_orders = order_service.post_orders
+
+    async def record_batch(args, idempotency_keys=None):
+        batch_sizes.append(len(args))
+        return await post_orders(args, idempotency_keys)
+
+    monkeypatch.setattr(order_service, "post_orders", record_batch)
+
+    try:
+        # Create item
+        product_id = await _post_product(post_product)
+
+        # Create orders concurrently, batches aren't limited by max_concurrency
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            responses = await asyncio.gather(
+                *(ac.post(URL, json={"items": {product_id: 1}}) for _ in range(orders_count))
+            )
+        created = [response for response in responses if response.status_code == 201]
+        rejected = [response for response in responses if response.status_code == 503]
+        assert len(created) + len(rejected) == orders_count
+        if max_waiting >= orders_count:
+            assert not rejected
+            assert sum(batch_sizes) == orders_count
+            assert len(batch_sizes) < orders_count / 4
+        else:
+            assert created and rejected
+            assert all(response.headers["Retry-After"] == "3" for response in rejected)
+        response = await _get_product(product_id)
+        assert response.json()["quantity"] == post_product["quantity"] - len(created)
+    finally:
+        configure_write_batching(False)
+        configure_write_admission(**cfg.get("write_admission", {}))
+
+    # Delete item
+    await _delete_product(product_id)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_order, write_batching, other_status_code",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, False, 201),
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_2, True, 201),
+        # The last unit in stock goes to the first request, retries still get its order
+        (DEFAULT_PRODUCTS, {"status": "Scarce order", "items": {1: 1}}, False, 400),
+        (DEFAULT_PRODUCTS, {"status": "Scarce order", "items": {1: 1}}, True, 400),
+    ],
+)
+async def test_post_order_idempotency_key(post_products: list[dict[str, Any]], post_order: dict[str, Any], write_batching: bool, other_status_code: int) -> None:
+    await clear_all_rows()
+    configure_write_batching(write_batching)
+
+    try:
+        # Create items
+        product_ids = await _post_products(post_products)
+        post_order_to_export = {"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)}
+
+        # Create the same order several times, sequentially and concurrently
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            responses = await asyncio.gather(
+                *(ac.post(URL, json=post_order_to_export, headers={"Idempotency-Key": "key-1"}) for _ in range(3))
+            )
+            responses.append(await ac.post(URL, json=post_order_to_export, headers={"Idempotency-Key": "key-1"}))
+            other = await ac.post(URL, json=post_order_to_export, headers={"Idempotency-Key": "key-2"})
+        assert [response.status_code for response in responses] == [201] * len(responses)
+        assert len({response.json()["id"] for response in responses}) == 1
+        assert other.status_code == other_status_code
+        if other_status_code == 201:
+            assert other.json()["id"] != responses[0].json()["id"]
+    finally:
+        configure_write_batching(False)
+
+    # Check quantity changes
+    for i, product_id in enumerate(product_ids):
+        response_product = (await _get_product(product_id)).json()
+        orders_placed = 2 if other_status_code == 201 else 1
+        assert response_product["quantity"] + orders_placed * post_order["items"].get(i, 0) == post_products[i]["quantity"]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, post_order, new_price",
+    [
+        (DEFAULT_PRODUCTS, DEFAULT_ORDER_1, 1000.0),
+    ],
+)
+async def test_order_total(post_products: list[dict[str, Any]], post_order: dict[str, Any], new_price: float) -> None:
+    await clear_all_rows()
+
+    # Create items and order
+    product_ids = await _post_products(post_products)
+    order_id = await _post_order({"status": post_order["status"], "items": _convert_order_items_ids(post_order["items"], product_ids)})
+    total = sum(post_products[key]["price"] * value for key, value in post_order["items"].items())
+    assert (await _get_order(order_id)).json()["total"] == pytest.approx(total)
+
+    # Price changes don't affect placed orders
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.put(f"{PRODUCTS_URL}/{product_ids[0]}", json={"price": new_price})
+        assert response.status_code == 200
+        response = await ac.get(URL)
+    assert (await _get_order(order_id)).json()["total"] == pytest.approx(total)
+    assert [order["total"] for order in response.json() if order["order_id"] == order_id] == [pytest.approx(total)]
+
+    # Delete items
+    await _delete_products(product_ids)
@@ -1,12 +1,18 @@
+import asyncio
+import json
 import logging.config
+import sqlite3
 from typing import Any
 
 import pytest
 import yaml
 from httpx import AsyncClient, Response
+from sqlalchemy import text
 
 from main import app
-from src.services import base_init
+from src.services import base_init, create_session
+from src.services.admission import configure_write_admission
+from src.services.pagination import encode_cursor
 
 with open("config.yaml", encoding="utf-8") as stream:
     try:
@@ -17,7 +23,10 @@ with open("config.yaml", encoding="utf-8") as stream:
 logging.config.dictConfig(cfg["logger"])
 logger = logging.getLogger("testing")
 
-base_init(cfg["db_path"])
+base_init(cfg["db_path"], cfg.get("sqlite_pragmas"), cfg.get("read_pool_size", 5))
+
+# The pooled connections' asyncio queues bind to the first loop that waits on them
+pytestmark = pytest.mark.asyncio(scope="session")
 
 URL = "/products"
 DEFAULT_PRODUCT_1 = {
@@ -230,3 +239,243 @@ async def test_delete_product(post_product: dict[str, Any], status_code: int, in
     if status_code == 204:
         return
     await _delete_product(product_id)
+
+
+@pytest.mark.parametrize(
+    "post_products, limit",
+    [
+        ([DEFAULT_PRODUCT_1, DEFAULT_PRODUCT_2, DEFAULT_PRODUCT_1], 1),
+        ([DEFAULT_PRODUCT_1, DEFAULT_PRODUCT_2, DEFAULT_PRODUCT_1], 2),
+    ],
+)
+async def test_get_products_cursor(post_products: list[dict[str, Any]], limit: int) -> None:
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Walk pages
+    seen_ids: list[int] = list()
+    params: dict[str, Any] = {"limit": limit}
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        while True:
+            response = await ac.get(URL, params=params)
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page) <= limit
+            seen_ids.extend(product["product_id"] for product in page)
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params = {"limit": limit, "after": response.headers["X-Next-Cursor"]}
+    assert seen_ids == product_ids
+
+    # Invalid cursors, including ids out of SQLite's integer range
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        for cursor in ("not a cursor", encode_cursor(10**20), encode_cursor(-(10**20))):
+            response = await ac.get(URL, params={"limit": limit, "after": cursor})
+            assert response.status_code == 400
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products",
+    [
+        DEFAULT_PRODUCTS,
+    ],
+)
+async def test_export_products(post_products: list[dict[str, Any]]) -> None:
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Export items
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    response_products = [json.loads(line) for line in response.text.splitlines()]
+    assert [product["product_id"] for product in response_products] == product_ids
+    for response_product, post_product in zip(response_products, post_products):
+        for key, value in post_product.items():
+            assert value == response_product[key]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, put_products, status_code",
+    [
+        (DEFAULT_PRODUCTS, [{"price": 1.5}, {"name": "New name", "quantity": 3}], 200),
+        (DEFAULT_PRODUCTS, [{"price": 1.5}, {"product_id": 100000, "quantity": 3}], 404),
+    ],
+)
+async def test_bulk_products(post_products: list[dict[str, Any]], put_products: list[dict[str, Any]], status_code: int) -> None:
+    # Create items
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.post(f"{URL}/bulk", json=post_products)
+    assert response.status_code == 201
+    product_ids = response.json()["ids"]
+    assert len(product_ids) == len(post_products)
+    for product_id, post_product in zip(product_ids, post_products):
+        response_product = (await _get_product(product_id)).json()
+        for key, value in post_product.items():
+            assert value == response_product[key]
+
+    # Update items
+    put_products = [{"product_id": product_id, **put_product} for product_id, put_product in zip(product_ids, put_products)]
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.put(f"{URL}/bulk", json=put_products)
+    assert response.status_code == status_code
+    if status_code == 200:
+        assert response.json()["ids"] == product_ids
+        for product_id, post_product, put_product in zip(product_ids, post_products, put_products):
+            response_product = (await _get_product(product_id)).json()
+            for key, value in {**post_product, **put_product}.items():
+                assert value == response_product[key]
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_products, low_stock_threshold",
+    [
+        (DEFAULT_PRODUCTS, 5),
+        (DEFAULT_PRODUCTS, 100),
+    ],
+)
+async def test_get_product_stats(post_products: list[dict[str, Any]], low_stock_threshold: int) -> None:
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Get stats
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/stats", params={"low_stock_threshold": low_stock_threshold})
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["products"] == len(post_products)
+    assert stats["total_stock"] == sum(product["quantity"] for product in post_products)
+    assert stats["stock_value"] == pytest.approx(sum(product["price"] * product["quantity"] for product in post_products))
+    low_stock_ids = [product_id for product_id, product in zip(product_ids, post_products) if product["quantity"] <= low_stock_threshold]
+    assert sorted(row["product_id"] for row in stats["low_stock"]) == sorted(low_stock_ids)
+
+    # Delete items
+    await _delete_products(product_ids)
+
+
+@pytest.mark.parametrize(
+    "post_product, max_waiting, requests_count, bulk",
+    [
+        (DEFAULT_PRODUCT_1, 0, 5, False),
+        (DEFAULT_PRODUCT_1, 10, 5, False),
+        (DEFAULT_PRODUCT_1, 0, 5, True),
+        (DEFAULT_PRODUCT_1, 10, 5, True),
+    ],
+)
+async def test_write_admission(post_product: dict[str, Any], max_waiting: int, requests_count: int, bulk: bool) -> None:
+    configure_write_admission(max_concurrency=1, max_waiting=max_waiting, retry_after=3)
+
+    # Create items concurrently
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            if bulk:
+                responses = await asyncio.gather(*(ac.post(f"{URL}/bulk", json=[post_product]) for _ in range(requests_count)))
+            else:
+                responses = await asyncio.gather(*(ac.post(URL, json=post_product) for _ in range(requests_count)))
+    finally:
+        configure_write_admission(**cfg.get("write_admission", {}))
+    created = [response for response in responses if response.status_code == 201]
+    rejected = [response for response in responses if response.status_code == 503]
+    assert len(created) + len(rejected) == requests_count
+    if max_waiting >= requests_count:
+        assert not rejected
+    else:
+        assert created and rejected
+        assert all(response.headers["Retry-After"] == "3" for response in rejected)
+
+    # Delete items
+    if bulk:
+        await _delete_products([id for response in created for id in response.json()["ids"]])
+    else:
+        await _delete_products([response.json()["id"] for response in created])
+
+
+@pytest.mark.parametrize(
+    "post_product, release_after, retries, expected_status",
+    [
+        (DEFAULT_PRODUCT_1, 0.1, 5, 201),
+        (DEFAULT_PRODUCT_1, None, 1, 503),
+    ],
+)
+async def test_write_admission_busy_retry(post_product: dict[str, Any], release_after: float | None, retries: int, expected_status: int) -> None:
+    configure_write_admission(retries=retries, retry_delay=0.1, retry_after=3)
+    busy_timeout = cfg["sqlite_pragmas"]["busy_timeout"]
+
+    # Hold the write lock from another connection, the writer fails fast on it
+    async with create_session() as session:
+        await session.execute(text("PRAGMA busy_timeout = 0"))
+    lock = sqlite3.connect(cfg["db_path"], isolation_level=None)
+    lock.execute("BEGIN IMMEDIATE")
+    try:
+        if release_after is not None:
+            asyncio.get_running_loop().call_later(release_after, lock.rollback)
+        async with AsyncClient(app=app, base_url="http://test") as ac:
+            response = await ac.post(URL, json=post_product)
+    finally:
+        lock.close()
+        async with create_session() as session:
+            await session.execute(text(f"PRAGMA busy_timeout = {busy_timeout}"))
+        configure_write_admission(**cfg.get("write_admission", {}))
+    assert response.status_code == expected_status
+    if expected_status == 503:
+        assert response.headers["Retry-After"] == "3"
+    else:
+        await _delete_product(response.json()["id"])
+
+
+@pytest.mark.parametrize(
+    "post_products, q, expected",
+    [
+        (
+            [
+                {"name": "Zephyr lamp", "description": "Desk lamp", "price": 10.0, "quantity": 1},
+                {"name": "Desk", "description": "Oak desk for a zephyr lamp", "price": 99.0, "quantity": 1},
+                {"name": "Chair", "description": "Office chair", "price": 50.0, "quantity": 1},
+            ],
+            "zeph",
+            [0, 1],
+        ),
+        (
+            [
+                {"name": "Zephyr lamp", "description": "Desk lamp", "price": 10.0, "quantity": 1},
+                {"name": "Chair", "description": "Office chair", "price": 50.0, "quantity": 1},
+            ],
+            'desk" OR chair',
+            [],
+        ),
+    ],
+)
+async def test_search_products(post_products: list[dict[str, Any]], q: str, expected: list[int]) -> None:
+    # Create items
+    product_ids = await _post_products(post_products)
+
+    # Search, the name match ranks first
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/search", params={"q": q})
+        assert response.status_code == 200
+        assert [product["product_id"] for product in response.json()] == [product_ids[i] for i in expected]
+
+        # Page through results
+        response = await ac.get(f"{URL}/search", params={"q": q, "limit": 1, "offset": 1})
+        assert [product["product_id"] for product in response.json()] == [product_ids[i] for i in expected[1:2]]
+
+        # Renamed and deleted products are reindexed
+        response = await ac.put(f"{URL}/{product_ids[-1]}", json={"name": "Zephyrus chair"})
+        assert response.status_code == 200
+        response = await ac.get(f"{URL}/search", params={"q": "zephyrus"})
+        assert [product["product_id"] for product in response.json()] == [product_ids[-1]]
+
+    await _delete_products(product_ids)
+    async with AsyncClient(app=app, base_url="http://test") as ac:
+        response = await ac.get(f"{URL}/search", params={"q": q})
+    assert response.json() == []